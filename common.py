@@ -19,6 +19,14 @@ IMAGE_NAME = 'sulir/jdk-study'
 DOCKER_PROJECT_SRC = '/mnt/project'
 GITHUB_CSV = 'github.csv'
 RESULTS_CSV = 'results.csv'
+METRICS_CSV = 'metrics.csv'
+RESULTS_COLUMNAR = 'results.npz'
+
+def get_image(java_version, slim=False):
+    return f'{IMAGE_NAME}:{get_image_tag(java_version, slim)}'
+
+def get_image_tag(java_version, slim=False):
+    return f'{java_version}-slim' if slim else str(java_version)
 
 def require_path_args(*args):
     if len(argv) == len(args) + 1:
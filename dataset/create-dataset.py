@@ -1,50 +1,142 @@
 #!/usr/bin/env python3
-from csv import DictReader
-from logging import basicConfig, error, info
-from os import environ, listdir, makedirs, walk
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from itertools import islice
+from logging import basicConfig, info
+from os import environ, listdir, makedirs
 from os.path import abspath, basename, dirname, isfile, join
 from random import seed, shuffle
-from re import fullmatch
 from shutil import rmtree
 from subprocess import CalledProcessError, check_output, DEVNULL, run
+from tempfile import TemporaryDirectory
 from sys import argv, exit, path
 path.insert(1, dirname(dirname(abspath(__file__))))
 from common import RANDOM_SEED, TOOLS, LOG_CONFIG
+from manifest import Manifest
+from metadata_store import MetadataStore
+from scanner import get_patterns, has_matching_file, text_has_matching_line
 
 GIT_URL = 'https://github.com/%s.git'
 EXCLUDE = [[r'.*\.java', r'\s*import\s+(javax\.microedition|(com\.(google\.)?)?android|androidx)\..*'],
            [r'AndroidManifest\.xml', r'.*']]
+CLONE_JOBS = 8
+PROBE_MAX_BLOBS = 16
+REGULAR_FILE_MODES = ('100644', '100755')
+MANIFEST_FILE = '.manifest.sqlite'
 
-def create_dataset(github_csv, output_dir, project_count):
+Candidate = namedtuple('Candidate', ['found', 'has_tool', 'hash', 'excluded', 'commit'], defaults=[None])
+
+def create_dataset(github_csv, output_dir, project_count, jobs=CLONE_JOBS, probe=True):
     basicConfig(**LOG_CONFIG)
     seed(RANDOM_SEED)
     makedirs(output_dir, exist_ok=True)
-    if listdir(output_dir):
-        print(f"Directory {output_dir} is not empty")
+    manifest_path = join(output_dir, MANIFEST_FILE)
+    if listdir(output_dir) and not isfile(manifest_path):
+        print(f"Directory {output_dir} is not empty and contains no {MANIFEST_FILE}")
         exit(1)
 
-    with open(github_csv) as in_file:
-        reader = DictReader(in_file)
-        projects = [row for row in reader if row['license'] != 'Other']
-        shuffle(projects)
-
-        included = 0
-        hashes = set()
-        for project in projects:
-            if create_project(project, output_dir, hashes):
-                included += 1
-                if included == project_count:
-                    break
-            else:
+    with MetadataStore(github_csv) as metadata, closing(Manifest(manifest_path)) as manifest:
+        offsets = metadata.offsets(lambda row: row['license'] != 'Other')
+        shuffle(offsets)
+
+        decided = manifest.decided()
+        projects = (project for project in map(metadata.row_at, offsets) if project['name'] not in decided)
+        included = manifest.accepted_count()
+        hashes = manifest.hashes()
+        if included >= project_count:
+            info("The dataset already contains %d projects", included)
+            return
+        info("Resuming with %d projects included and %d candidates decided", included, len(decided))
+
+        with closing(vet_projects(projects, output_dir, jobs, probe)) as candidates:
+            for project, candidate in candidates:
+                reason = get_rejection_reason(candidate, hashes)
+                if reason is not None:
+                    delete_project(project, output_dir)
+                manifest.record(project['name'], candidate, reason)
+                if reason is None:
+                    included += 1
+                    if included == project_count:
+                        break
+
+def vet_projects(projects, output_dir, jobs=CLONE_JOBS, probe=True):
+    projects = iter(projects)
+    with ThreadPoolExecutor(jobs) as executor:
+        pending = deque((p, executor.submit(vet_project, p, output_dir, probe)) for p in islice(projects, 2 * jobs))
+        try:
+            while pending:
+                project, future = pending.popleft()
+                for next_project in islice(projects, 1):
+                    pending.append((next_project, executor.submit(vet_project, next_project, output_dir, probe)))
+                yield project, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown()
+            for project, _ in pending:
                 delete_project(project, output_dir)
 
-def create_project(project, output_dir, hashes):
+def vet_project(project, output_dir, probe=True):
+    delete_project(project, output_dir)
+    if probe:
+        rejected = probe_repo(project, output_dir)
+        if rejected is not None:
+            return rejected
+
     info("Cloning " + project['name'])
     project_dir = clone_repo(project, output_dir)
-    return (project_dir is not None
-            and has_tool(project_dir)
-            and not project_is_duplicate(project_dir, hashes)
-            and not project_has_excluded_technology(project_dir))
+    if project_dir is None:
+        return Candidate(False, False, None, None)
+    if not has_tool(project_dir):
+        return Candidate(True, False, None, None, get_commit(project_dir))
+    return Candidate(True, True, get_project_hash(project_dir), project_has_excluded_technology(project_dir),
+                     get_commit(project_dir))
+
+def probe_repo(project, output_dir):
+    info("Probing " + project['name'])
+    with TemporaryDirectory() as probe_dir:
+        try:
+            run(['git', 'clone', '--depth=1', '--filter=blob:none', '--no-checkout', GIT_URL % project['name'],
+                 probe_dir], stdin=DEVNULL, stdout=DEVNULL, stderr=DEVNULL,
+                env=environ | {'GIT_TERMINAL_PROMPT': '0'}, check=True)
+            tree = list_tree(probe_dir)
+            root_files = {path for _, _, path in tree if '/' not in path}
+            if not any(file in root_files for tool in TOOLS for file in tool.files):
+                return Candidate(True, False, None, None, get_commit(probe_dir))
+
+            excluded_blobs = [(object_id, patterns) for mode, object_id, path in tree if mode in REGULAR_FILE_MODES
+                              if (patterns := get_patterns(basename(path), EXCLUDE))]
+            if len(excluded_blobs) <= PROBE_MAX_BLOBS and any(blob_matches(probe_dir, object_id, patterns)
+                                                              for object_id, patterns in excluded_blobs):
+                return Candidate(True, True, get_project_hash(probe_dir, 'ls-tree -r', 'HEAD'), True,
+                                 get_commit(probe_dir))
+        except CalledProcessError:
+            pass
+    return None
+
+def list_tree(repo_dir):
+    output = check_output(['git', 'ls-tree', '-r', '-z', 'HEAD'], cwd=repo_dir).decode(errors='surrogateescape')
+    tree = []
+    for entry in filter(None, output.split('\0')):
+        metadata, path = entry.split('\t', 1)
+        mode, _type, object_id = metadata.split()
+        tree.append((mode, object_id, path))
+    return tree
+
+def blob_matches(repo_dir, object_id, patterns):
+    blob = check_output(['git', 'cat-file', 'blob', object_id], cwd=repo_dir, stdin=DEVNULL)
+    return text_has_matching_line(blob.decode('ascii', errors='ignore'), patterns)
+
+def get_rejection_reason(candidate, hashes):
+    if not candidate.found:
+        return 'not found'
+    if not candidate.has_tool:
+        return 'no build tool'
+    if candidate.hash in hashes:
+        return 'duplicate'
+    hashes.add(candidate.hash)
+    return 'excluded technology' if candidate.excluded else None
 
 def delete_project(project, output_dir):
     rmtree(get_project_dir(project, output_dir), ignore_errors=True)
@@ -69,37 +161,20 @@ def has_tool(project_dir):
             return True
     return False
 
-def project_is_duplicate(project_dir, hashes):
-    command = 'git ls-files --format="%(objectname) %(path)" | git hash-object --stdin'
-    project_hash = check_output(command, shell=True, cwd=project_dir).decode().strip()
+def get_commit(project_dir):
+    return check_output(['git', 'rev-parse', 'HEAD'], cwd=project_dir).decode().strip()
 
-    if project_hash in hashes:
-        return True
-    else:
-        hashes.add(project_hash)
-        return False
-
-def project_has_excluded_technology(project_dir):
-    for root, dirs, files in walk(project_dir):
-        for file in files:
-            for name, content in EXCLUDE:
-                if file_matches(join(root, file), name, content):
-                    return True
-    return False
+def get_project_hash(project_dir, list_command='ls-files', revision=''):
+    command = f'git {list_command} --format="%(objectname) %(path)" {revision} | git hash-object --stdin'
+    return check_output(command, shell=True, cwd=project_dir).decode().strip()
 
-def file_matches(file, name, content):
-    if fullmatch(name, basename(file)):
-        try:
-            with open(file, encoding='ascii', errors='ignore') as f:
-                if any(fullmatch(content, line.rstrip()) for line in f):
-                    return True
-        except FileNotFoundError as e:
-            error(e)
-            return True
-    return False
+def project_has_excluded_technology(project_dir, jobs=1):
+    return has_matching_file(project_dir, EXCLUDE, jobs)
 
 if __name__ == '__main__':
-    if len(argv) == 4 and argv[3].isdigit():
-        create_dataset(argv[1], argv[2], int(argv[3]))
+    probe = '--no-probe' not in argv
+    args = [arg for arg in argv if arg != '--no-probe']
+    if len(args) in (4, 5) and all(arg.isdigit() for arg in args[3:]):
+        create_dataset(args[1], args[2], *map(int, args[3:]), probe=probe)
     else:
-        print(f"Usage: {basename(__file__)} <github.csv> <output_dir> <project_count>")
+        print(f"Usage: {basename(__file__)} [--no-probe] <github.csv> <output_dir> <project_count> [clone_jobs]")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+from collections import defaultdict
+from hashlib import sha256
+from logging import basicConfig, info
+from os import link, lstat, makedirs, replace, scandir, stat, walk
+from os.path import abspath, basename, dirname, join
+from stat import S_IMODE, S_ISREG
+from sys import argv, exit, path
+from tempfile import TemporaryDirectory
+path.insert(1, dirname(dirname(abspath(__file__))))
+from common import LOG_CONFIG
+
+SKIPPED_DIRS = {'.git'}
+CHUNK_SIZE = 1 << 20
+TEMP_PREFIX = '.dedup-'
+
+def dedup_dataset(dataset_dir, store_dir):
+    basicConfig(**LOG_CONFIG)
+    makedirs(store_dir, exist_ok=True)
+    files = list_files(dataset_dir)
+    sizes = defaultdict(int)
+    for _, file_stat in files:
+        sizes[file_stat.st_size] += 1
+
+    saved_files = saved_bytes = 0
+    for file, file_stat in files:
+        if sizes[file_stat.st_size] > 1 and link_to_store(file, file_stat, store_dir):
+            saved_files += 1
+            saved_bytes += file_stat.st_size
+    info("Replaced %d files by hard links, saving %.1f MiB", saved_files, saved_bytes / 2 ** 20)
+    info("The store saves %.1f MiB in total", get_store_savings(store_dir) / 2 ** 20)
+
+def list_files(dataset_dir):
+    files = []
+    for project in sorted(entry.path for entry in scandir(dataset_dir) if entry.is_dir(follow_symlinks=False)):
+        for root, dirs, names in walk(project):
+            dirs[:] = sorted(d for d in dirs if d not in SKIPPED_DIRS)
+            for name in sorted(names):
+                file = join(root, name)
+                file_stat = lstat(file)
+                if S_ISREG(file_stat.st_mode) and file_stat.st_size > 0:
+                    files.append((file, file_stat))
+    return files
+
+def link_to_store(file, file_stat, store_dir):
+    entry = get_store_entry(store_dir, get_file_hash(file), S_IMODE(file_stat.st_mode))
+    try:
+        entry_stat = stat(entry)
+    except FileNotFoundError:
+        makedirs(dirname(entry), exist_ok=True)
+        link(file, entry)
+        return False
+
+    if (entry_stat.st_dev, entry_stat.st_ino) == (file_stat.st_dev, file_stat.st_ino):
+        return False
+    with TemporaryDirectory(prefix=TEMP_PREFIX, dir=dirname(file)) as temp_dir:
+        temp_file = join(temp_dir, basename(file))
+        link(entry, temp_file)
+        replace(temp_file, file)
+    return True
+
+def get_store_entry(store_dir, file_hash, mode):
+    return join(store_dir, file_hash[:2], f'{file_hash}-{mode:o}')
+
+def get_file_hash(file):
+    file_hash = sha256()
+    with open(file, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+def get_store_savings(store_dir):
+    savings = 0
+    for root, _, names in walk(store_dir):
+        for name in names:
+            entry_stat = stat(join(root, name))
+            savings += entry_stat.st_size * max(entry_stat.st_nlink - 2, 0)
+    return savings
+
+if __name__ == '__main__':
+    if len(argv) == 3:
+        dedup_dataset(argv[1], argv[2])
+    else:
+        print(f"Usage: {basename(__file__)} <dataset_dir> <store_dir>")
+        exit(1)
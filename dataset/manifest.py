@@ -0,0 +1,35 @@
+from sqlite3 import connect
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS candidates (
+    position INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    accepted INTEGER NOT NULL,
+    reason TEXT,
+    hash TEXT,
+    "commit" TEXT
+);
+'''
+
+class Manifest:
+    def __init__(self, path):
+        self.db = connect(path)
+        self.db.executescript(SCHEMA)
+
+    def decided(self):
+        return {name for name, in self.db.execute('SELECT name FROM candidates')}
+
+    def accepted_count(self):
+        return self.db.execute('SELECT COUNT(*) FROM candidates WHERE accepted = 1').fetchone()[0]
+
+    def hashes(self):
+        rows = self.db.execute('SELECT hash FROM candidates WHERE hash IS NOT NULL')
+        return {project_hash for project_hash, in rows}
+
+    def record(self, name, candidate, reason):
+        with self.db:
+            self.db.execute('INSERT INTO candidates (name, accepted, reason, hash, "commit") VALUES (?, ?, ?, ?, ?)',
+                            (name, reason is None, reason, candidate.hash, candidate.commit))
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,97 @@
+from concurrent.futures import as_completed, ProcessPoolExecutor
+from functools import lru_cache
+from io import StringIO
+from logging import error
+from os import walk
+from os.path import basename, isdir, join
+from re import compile
+from subprocess import CalledProcessError, check_output, DEVNULL
+
+GITLINK_MODE = '160000'
+SYMLINK_MODE = '120000'
+CHUNK_SIZE = 2000
+CONTEXT_DEPENDENT = ('^', '$', '\\A', '\\Z', '\\B', '(?<')
+UNANCHORED_PREFIXES = ('\\s*', '.*', ' *')
+QUANTIFIER_SUFFIXES = ('?', '+', '{')
+
+def has_matching_file(project_dir, rules, jobs=1):
+    files = list_files(project_dir)
+    if jobs == 1 or len(files) <= CHUNK_SIZE:
+        return any_file_matches(files, rules)
+
+    with ProcessPoolExecutor(jobs) as executor:
+        futures = [executor.submit(any_file_matches, files[i:i + CHUNK_SIZE], rules)
+                   for i in range(0, len(files), CHUNK_SIZE)]
+        try:
+            return any(future.result() for future in as_completed(futures))
+        finally:
+            for future in futures:
+                future.cancel()
+
+def list_files(project_dir):
+    if isdir(join(project_dir, '.git')):
+        try:
+            output = check_output(['git', 'ls-files', '--stage', '-z'], cwd=project_dir, stderr=DEVNULL)
+            return list_index_files(project_dir, output.decode(errors='surrogateescape'))
+        except CalledProcessError:
+            pass
+    return [join(root, file) for root, _, files in walk(project_dir) for file in files]
+
+def list_index_files(project_dir, output):
+    files = []
+    for entry in filter(None, output.split('\0')):
+        metadata, path = entry.split('\t', 1)
+        mode = metadata.split(' ', 1)[0]
+        file = join(project_dir, path)
+        if mode != GITLINK_MODE and not (mode == SYMLINK_MODE and isdir(file)):
+            files.append(file)
+    return files
+
+def any_file_matches(files, rules):
+    for file in files:
+        patterns = get_patterns(basename(file), rules)
+        if patterns and file_has_matching_line(file, patterns):
+            return True
+    return False
+
+def get_patterns(name, rules):
+    names, compiled_rules = compile_rules(tuple(map(tuple, rules)))
+    if not names.fullmatch(name):
+        return []
+    return [(content, prefilter) for name_pattern, content, prefilter in compiled_rules
+            if name_pattern.fullmatch(name)]
+
+@lru_cache
+def compile_rules(rules):
+    names = compile('|'.join(f'(?:{name})' for name, _ in rules))
+    compiled_rules = []
+    for name, content in rules:
+        context_dependent = any(token in content for token in CONTEXT_DEPENDENT)
+        prefilter = None if context_dependent else compile(get_search_pattern(content))
+        compiled_rules.append((compile(name), compile(content), prefilter))
+    return names, compiled_rules
+
+def get_search_pattern(content):
+    while prefix := next((p for p in UNANCHORED_PREFIXES if content.startswith(p)), None):
+        if content[len(prefix):len(prefix) + 1] in QUANTIFIER_SUFFIXES:
+            break
+        content = content[len(prefix):]
+    while content.endswith('.*') and (len(content[:-2]) - len(content[:-2].rstrip('\\'))) % 2 == 0:
+        content = content[:-2]
+    return content
+
+def file_has_matching_line(file, patterns):
+    try:
+        with open(file, 'rb') as f:
+            text = f.read().decode('ascii', errors='ignore')
+    except FileNotFoundError as e:
+        error(e)
+        return True
+    return text_has_matching_line(text, patterns)
+
+def text_has_matching_line(text, patterns):
+    for content, prefilter in patterns:
+        if prefilter is None or prefilter.search(text):
+            if any(content.fullmatch(line.rstrip()) for line in StringIO(text, newline=None)):
+                return True
+    return False
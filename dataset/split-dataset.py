@@ -1,13 +1,22 @@
 #!/usr/bin/env python3
-from os import scandir, renames
-from os.path import abspath, basename, dirname
+from argparse import ArgumentParser
+from collections import defaultdict
+from csv import DictReader, DictWriter
+from heapq import heappop, heappush
+from math import log2
+from os import lstat, scandir, renames, walk
+from os.path import abspath, basename, dirname, isfile
 from os.path import join
 from random import seed, shuffle
-from sys import argv, path
+from statistics import median
+from sys import path
 path.insert(1, dirname(dirname(abspath(__file__))))
-from common import RANDOM_SEED
+from common import MAX_JAVA, MIN_JAVA, RANDOM_SEED, TOOLS
 
 PART_DIR = 'projects%d'
+MANIFEST_FIELDS = ['name', 'part', 'cost']
+TOOL_WEIGHTS = {'Gradle': 4.0, 'Maven': 2.0, 'Ant': 1.0}
+BUILD_FILES = {file for tool in TOOLS for file in tool.files}
 
 def split_dataset(dataset_dir, num_parts):
     seed(RANDOM_SEED)
@@ -23,9 +32,87 @@ def split_dataset(dataset_dir, num_parts):
             project = projects.pop()
             renames(project, join(part, basename(project)))
 
+def plan_partitions(dataset_dir, num_parts, manifest_csv, metrics_csv=None):
+    project_dirs = sorted(file.path for file in scandir(dataset_dir) if file.is_dir())
+    costs = estimate_costs(project_dirs, metrics_csv)
+    parts = balance_partitions(costs, num_parts)
+
+    with open(manifest_csv, 'w') as out_file:
+        writer = DictWriter(out_file, MANIFEST_FIELDS)
+        writer.writeheader()
+        for name in sorted(parts):
+            writer.writerow({'name': name, 'part': parts[name], 'cost': round(costs[name], 1)})
+
+    loads = get_loads(costs, parts, num_parts)
+    for part in range(1, num_parts + 1):
+        count = sum(1 for p in parts.values() if p == part)
+        print(f"Part {part}: {count} projects, predicted cost {loads[part]:.0f}")
+    round_robin = get_loads(costs, get_round_robin_parts(project_dirs, num_parts), num_parts)
+    print(f"Predicted makespan {max(loads.values()):.0f} (round-robin: {max(round_robin.values()):.0f})")
+
+def estimate_costs(project_dirs, metrics_csv=None):
+    estimated = {get_project_name(project_dir): estimate_cost(project_dir) for project_dir in project_dirs}
+    measured = read_measured_costs(metrics_csv) if metrics_csv else {}
+    ratios = [measured[name] / cost for name, cost in estimated.items() if name in measured and cost > 0]
+    scale = median(ratios) if ratios else 1.0
+    return {name: measured.get(name, scale * cost) for name, cost in estimated.items()}
+
+def estimate_cost(project_dir):
+    size = 0
+    module_dirs = set()
+    for root, dirs, files in walk(project_dir):
+        dirs[:] = [d for d in dirs if d != '.git']
+        for file in files:
+            size += lstat(join(root, file)).st_size
+            if file in BUILD_FILES:
+                module_dirs.add(root)
+
+    tool = next((tool.name for tool in TOOLS if any(isfile(join(project_dir, f)) for f in tool.files)), None)
+    size_factor = 1 + log2(1 + size / 2 ** 20)
+    module_factor = 1 + log2(max(len(module_dirs), 1))
+    return TOOL_WEIGHTS.get(tool, 1.0) * size_factor * module_factor
+
+def read_measured_costs(metrics_csv):
+    seconds = defaultdict(list)
+    with open(metrics_csv) as in_file:
+        for row in DictReader(in_file):
+            if row['wall_seconds']:
+                seconds[row['name']].append(float(row['wall_seconds']))
+    return {name: sum(values) / len(values) * (MAX_JAVA - MIN_JAVA + 1) for name, values in seconds.items()}
+
+def balance_partitions(costs, num_parts):
+    loads = [(0.0, part) for part in range(1, num_parts + 1)]
+    parts = {}
+    for name in sorted(costs, key=lambda n: (-costs[n], n)):
+        load, part = heappop(loads)
+        parts[name] = part
+        heappush(loads, (load + costs[name], part))
+    return parts
+
+def get_round_robin_parts(project_dirs, num_parts):
+    seed(RANDOM_SEED)
+    projects = list(project_dirs)
+    shuffle(projects)
+    return {get_project_name(project): (len(projects) - 1 - i) % num_parts + 1 for i, project in enumerate(projects)}
+
+def get_loads(costs, parts, num_parts):
+    loads = dict.fromkeys(range(1, num_parts + 1), 0.0)
+    for name, part in parts.items():
+        loads[part] += costs[name]
+    return loads
+
+def get_project_name(project_dir):
+    return basename(project_dir).replace('_', '/', 1)
+
 if __name__ == '__main__':
-    if len(argv) == 3:
-        split_dataset(argv[1], argv[2])
+    parser = ArgumentParser(description="Split the dataset into parts built on separate machines")
+    parser.add_argument('dataset_dir')
+    parser.add_argument('num_parts', type=int)
+    parser.add_argument('--manifest', metavar='CSV',
+                        help="instead of moving projects round-robin, write cost-balanced parts to this file")
+    parser.add_argument('--metrics', metavar='CSV', help="metrics.csv of earlier runs used to refine the costs")
+    args = parser.parse_args()
+    if args.manifest:
+        plan_partitions(args.dataset_dir, args.num_parts, args.manifest, args.metrics)
     else:
-        print('Usage: %s <dataset_dir> <num_parts>' % basename(__file__))
-        exit(1)
+        split_dataset(args.dataset_dir, args.num_parts)
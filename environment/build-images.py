@@ -1,10 +1,21 @@
 #!/usr/bin/env python3
-from logging import info, basicConfig
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from json import dumps, loads
+from logging import error, info, basicConfig, warning
+from os import link, replace
 from os.path import dirname, realpath, abspath
+from pathlib import Path
 from pty import spawn
+from shutil import copyfileobj
+from subprocess import DEVNULL, PIPE, STDOUT, run
 from sys import exit, path
+from tarfile import open as open_tar
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+from urllib.request import urlopen
 path.insert(1, dirname(dirname(abspath(__file__))))
-from common import IMAGE_NAME, MIN_JAVA, MAX_JAVA, LOG_CONFIG
+from common import IMAGE_NAME, MIN_JAVA, MAX_JAVA, LOG_CONFIG, get_image, get_image_tag
 
 VERSIONS = {
     'Zulu': {6: '6.22.0.3', 7: '7.56.0.11', 8: '8.84.0.15', 9: '9.0.7.1', 10: '10.3.5', 11: '11.78.15',
@@ -19,24 +30,154 @@ VERSIONS = {
     'Ivy': {6: '2.4.0', 7: '2.5.0', 8: '2.5.3'},
     'Bouncy_Castle': {6: '1.73', 7: ''},
 }
+BOUNCY_CASTLE_URL = 'https://repo1.maven.org/maven2/org/bouncycastle/%s-jdk15to18/{Bouncy_Castle}/%s-jdk15to18-{Bouncy_Castle}.jar'
+ARTIFACT_URLS = {
+    'Gradle': ['https://services.gradle.org/distributions/gradle-{Gradle}-bin.zip'],
+    'Maven': ['https://archive.apache.org/dist/maven/maven-3/{Maven}/binaries/apache-maven-{Maven}-bin.tar.gz'],
+    'Ant': ['https://dlcdn.apache.org/ant/binaries/apache-ant-{Ant}-bin.tar.gz'],
+    'Ivy': ['https://archive.apache.org/dist/ant/ivy/{Ivy}/apache-ivy-{Ivy}-bin.tar.gz'],
+    'Zulu': ['https://cdn.azul.com/zulu/bin/zulu{Zulu}-ca-jdk{JDK}-linux_x64.tar.gz'],
+    'Bouncy_Castle': [BOUNCY_CASTLE_URL % (library, library) for library in ('bcprov', 'bcutil', 'bctls')],
+}
+IMAGE_JOBS = 4
+ARTIFACT_CACHE = Path.home() / '.cache' / 'jdk-study' / 'artifacts'
+CHECKSUMS_FILE = Path(dirname(realpath(__file__))) / 'checksums.txt'
+TRUSTED_CHECKSUMS = 'trusted-checksums.txt'
+CHUNK_SIZE = 1 << 20
+CONTEXT_FILES = ['Dockerfile', 'run-build.sh']
+FINGERPRINT_LABEL = 'jdk-study.fingerprint'
+IMAGE_MANIFEST = 'images.json'
 
-def build_all_images():
+def build_all_images(jobs=IMAGE_JOBS, cache_dir=ARTIFACT_CACHE, mirror=None, checksums_file=CHECKSUMS_FILE,
+                     force=False, cds=False, slim=False):
     basicConfig(**LOG_CONFIG | {'format': '\n%s\n' % LOG_CONFIG['format']})
+    manifest_path = Path(cache_dir) / IMAGE_MANIFEST
+    manifest = loads(manifest_path.read_text()) if manifest_path.is_file() else {}
+    inputs = {java_version: get_image_inputs(java_version, cds, slim)
+              for java_version in range(MIN_JAVA, MAX_JAVA + 1)}
+    stale = get_stale_images(inputs, manifest, force)
+    for java_version in inputs:
+        info("Image for Java %d: %s", java_version, stale.get(java_version, "up to date, skipped"))
+    failed = []
+    if stale:
+        failed = build_stale_images(inputs, stale, manifest, jobs, cache_dir, mirror, checksums_file)
+        manifest_path.write_text(dumps(manifest, indent=2, sort_keys=True))
+    if slim:
+        report_sizes(inputs)
+
+    if failed:
+        error("Building images failed for Java %s", ', '.join(map(str, failed)))
+        exit(1)
+
+def build_stale_images(inputs, stale, manifest, jobs, cache_dir, mirror, checksums_file):
+    java_versions = sorted(stale)
+    urls = {java_version: get_artifact_urls(java_version) for java_version in java_versions}
+    fetch_artifacts(sorted({url for version_urls in urls.values() for url in version_urls}), cache_dir, jobs,
+                    mirror, checksums_file)
+
+    with ThreadPoolExecutor(jobs) as executor:
+        built = list(executor.map(lambda v: build_image(v, urls[v], cache_dir, jobs == 1, inputs[v]), java_versions))
+    for java_version, success in zip(java_versions, built):
+        if success:
+            manifest[get_image_tag(java_version, is_slim(inputs[java_version]))] = inputs[java_version]
+    return [java_version for java_version, success in zip(java_versions, built) if not success]
+
+def get_image_inputs(java_version, cds=False, slim=False):
+    context_dir = Path(dirname(realpath(__file__)))
+    inputs = {software: get_version(software, java_version) for software in VERSIONS}
+    inputs |= {'Use_CDS': str(int(cds)), 'Slim': str(int(slim))}
+    return inputs | {file: sha256((context_dir / file).read_bytes()).hexdigest() for file in CONTEXT_FILES}
+
+def get_fingerprint(inputs):
+    return sha256(dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+def get_stale_images(inputs, manifest, force=False):
+    stale = {}
+    for java_version, image_inputs in inputs.items():
+        fingerprint = get_image_fingerprint(get_image(java_version, is_slim(image_inputs)))
+        previous = manifest.get(get_image_tag(java_version, is_slim(image_inputs)), {})
+        if force:
+            stale[java_version] = "rebuilt, forced"
+        elif fingerprint is None:
+            stale[java_version] = "built, no image found"
+        elif fingerprint != get_fingerprint(image_inputs):
+            changed = sorted(key for key in image_inputs if previous.get(key) != image_inputs[key])
+            if get_fingerprint(previous) != fingerprint or not changed:
+                changed = ["unknown inputs"]
+            stale[java_version] = "rebuilt, changed: " + ', '.join(changed)
+    return stale
 
-    for java_version in range(MIN_JAVA, MAX_JAVA + 1):
-        info("Building image for Java %d", java_version)
-        if not build_image(java_version):
-            exit(1)
+def is_slim(inputs):
+    return inputs.get('Slim') == '1'
 
-def build_image(java_version):
-    command = ['docker', 'build']
-    for software, versions in VERSIONS.items():
-        version = get_version(software, java_version)
-        command += '--build-arg', '%s=%s' % (software.upper(), version)
+def get_image_fingerprint(image):
+    process = run(['docker', 'image', 'inspect', '--format', f'{{{{ index .Config.Labels "{FINGERPRINT_LABEL}" }}}}',
+                   image], stdout=PIPE, stderr=DEVNULL)
+    fingerprint = process.stdout.decode().strip()
+    return fingerprint if process.returncode == 0 and fingerprint not in ('', '<no value>') else None
+
+def build_image(java_version, urls, cache_dir, interactive=True, inputs=None):
+    info("Building image for Java %d", java_version)
+    with TemporaryDirectory(prefix='context-', dir=cache_dir) as artifacts_dir:
+        for url in urls:
+            link(Path(cache_dir) / get_artifact_name(url), Path(artifacts_dir) / get_artifact_name(url))
+        command = get_build_command(java_version, artifacts_dir, inputs or get_image_inputs(java_version))
+        if interactive:
+            return spawn(command) == 0
+
+        process = run(command, stdout=PIPE, stderr=STDOUT)
+        if process.returncode != 0:
+            error("Build of the image for Java %d failed:\n%s", java_version, process.stdout.decode(errors='replace'))
+        return process.returncode == 0
+
+def get_build_command(java_version, artifacts_dir, inputs):
+    command = ['docker', 'build', '--label', f'{FINGERPRINT_LABEL}={get_fingerprint(inputs)}']
+    for name, value in inputs.items():
+        if name not in CONTEXT_FILES:
+            command += '--build-arg', '%s=%s' % (name.upper(), value)
     context_dir = dirname(realpath(__file__))
-    command += '--tag', f'{IMAGE_NAME}:{java_version}', context_dir
+    command += '--build-context', f'artifacts={artifacts_dir}'
+    command += '--tag', get_image(java_version, is_slim(inputs)), context_dir
+    return command
+
+def report_sizes(inputs):
+    for java_version in inputs:
+        full, slim = (get_image_size(get_image(java_version, slim)) for slim in (False, True))
+        if full and slim:
+            info("Image for Java %d: %s full, %s slim (%.0f%% smaller)", java_version, format_size(full),
+                 format_size(slim), 100 * (1 - slim / full))
+        elif slim:
+            info("Image for Java %d: %s slim, no full image to compare", java_version, format_size(slim))
+
+def get_image_size(image):
+    process = run(['docker', 'image', 'inspect', '--format', '{{.Size}}', image], stdout=PIPE, stderr=DEVNULL)
+    size = process.stdout.decode().strip()
+    return int(size) if process.returncode == 0 and size.isdigit() else None
+
+def format_size(size):
+    return f'{size / 2 ** 20:.0f} MiB'
 
-    return spawn(command) == 0
+def export_images(bundle, slim=False):
+    images = [get_image(java_version, slim) for java_version in range(MIN_JAVA, MAX_JAVA + 1)]
+    info("Exporting %d images to %s", len(images), bundle)
+    if run(['docker', 'save', '--output', str(bundle), *images]).returncode != 0:
+        error("Exporting the images failed")
+        exit(1)
+    referenced, stored = count_bundle_layers(bundle)
+    info("The bundle stores %d layers referenced %d times, %s in total", stored, referenced,
+         format_size(Path(bundle).stat().st_size))
+
+def count_bundle_layers(bundle):
+    with open_tar(bundle) as tar:
+        manifest = loads(tar.extractfile('manifest.json').read())
+    layers = [layer for image in manifest for layer in image['Layers']]
+    return len(layers), len(set(layers))
+
+def import_images(bundle):
+    info("Importing images from %s", bundle)
+    if run(['docker', 'load', '--input', str(bundle)]).returncode != 0:
+        error("Importing the images failed")
+        exit(1)
 
 def get_version(software, java_version):
     versions = VERSIONS[software]
@@ -49,5 +190,99 @@ def get_version(software, java_version):
 
     raise KeyError(f"No {software} version found for Java {java_version}")
 
+def get_artifact_urls(java_version):
+    versions = {software: get_version(software, java_version) for software in VERSIONS}
+    return [url.format(**versions) for software, urls in ARTIFACT_URLS.items() if versions[software] for url in urls]
+
+def get_artifact_name(url):
+    return url.rsplit('/', 1)[1]
+
+def fetch_artifacts(urls, cache_dir, jobs=IMAGE_JOBS, mirror=None, checksums_file=CHECKSUMS_FILE, pin=False):
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    pinned = read_checksums(checksums_file)
+    trusted_file = Path(cache_dir) / TRUSTED_CHECKSUMS
+    trusted = read_checksums(trusted_file)
+    checksums = trusted | pinned
+    unknown = sorted(get_artifact_name(url) for url in urls if get_artifact_name(url) not in pinned)
+    if unknown and not pin:
+        warning("No pinned checksums in %s for %s, trusting their first download", checksums_file, ', '.join(unknown))
+    with ThreadPoolExecutor(jobs) as executor:
+        digests = list(executor.map(lambda url: fetch_artifact(url, cache_dir, checksums.get(get_artifact_name(url)),
+                                                               mirror), urls))
+
+    if unknown:
+        fetched = {name: digest for name, digest in zip(map(get_artifact_name, urls), digests) if name in unknown}
+        if pin:
+            write_checksums(checksums_file, pinned | fetched)
+        else:
+            write_checksums(trusted_file, trusted | fetched)
+
+def pin_checksums(jobs=IMAGE_JOBS, cache_dir=ARTIFACT_CACHE, mirror=None, checksums_file=CHECKSUMS_FILE):
+    basicConfig(**LOG_CONFIG)
+    urls = {url for java_version in range(MIN_JAVA, MAX_JAVA + 1) for url in get_artifact_urls(java_version)}
+    fetch_artifacts(sorted(urls), cache_dir, jobs, mirror, checksums_file, pin=True)
+
+def fetch_artifact(url, cache_dir, expected=None, mirror=None):
+    name = get_artifact_name(url)
+    artifact = Path(cache_dir) / name
+    if artifact.is_file():
+        digest = get_file_hash(artifact)
+        if expected in (None, digest):
+            return digest
+        info("Cached %s does not match its checksum, fetching it again", name)
+
+    info("Fetching %s", name)
+    with urlopen(f'{mirror}/{name}' if mirror else url) as response, \
+            NamedTemporaryFile(dir=cache_dir, prefix=f'.{name}.', delete=False) as temp_file:
+        copyfileobj(response, temp_file)
+    digest = get_file_hash(temp_file.name)
+    if expected not in (None, digest):
+        Path(temp_file.name).unlink()
+        raise ValueError(f"Checksum of {name} is {digest}, expected {expected}")
+    replace(temp_file.name, artifact)
+    return digest
+
+def get_file_hash(file):
+    file_hash = sha256()
+    with open(file, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+def write_checksums(checksums_file, checksums):
+    with open(checksums_file, 'w') as checksums_out:
+        checksums_out.writelines(f'{digest}  {name}\n' for name, digest in sorted(checksums.items()))
+
+def read_checksums(checksums_file):
+    if not Path(checksums_file).is_file():
+        return {}
+    with open(checksums_file) as checksums_in:
+        return {name: digest for digest, name in (line.split() for line in checksums_in if line.strip())}
+
 if __name__ == '__main__':
-    build_all_images()
+    parser = ArgumentParser(description="Build a Docker image for every Java version")
+    parser.add_argument('--jobs', type=int, default=IMAGE_JOBS, help="number of images built at once")
+    parser.add_argument('--cache-dir', type=Path, default=ARTIFACT_CACHE,
+                        help="directory of downloaded JDKs and build tools (default: %(default)s)")
+    parser.add_argument('--mirror', metavar='URL', help="download all artifacts from this base URL instead")
+    parser.add_argument('--force', action='store_true', help="rebuild images even if their inputs are unchanged")
+    parser.add_argument('--cds', action='store_true',
+                        help="create class data sharing archives of the build tools to shorten their startup")
+    parser.add_argument('--slim', action='store_true',
+                        help="build slim images without sources, demos and documentation, tagged as JAVA-slim")
+    bundle_group = parser.add_mutually_exclusive_group()
+    bundle_group.add_argument('--export', type=Path, metavar='FILE',
+                              help="after building, save all images into one bundle with shared layers stored once")
+    bundle_group.add_argument('--import', dest='import_bundle', type=Path, metavar='FILE',
+                              help="load the images from a bundle made by --export instead of building them")
+    parser.add_argument('--pin-checksums', action='store_true',
+                        help="download the artifacts missing in checksums.txt and record their checksums there")
+    args = parser.parse_args()
+    if args.pin_checksums:
+        pin_checksums(args.jobs, args.cache_dir, args.mirror)
+    elif args.import_bundle:
+        import_images(args.import_bundle)
+    else:
+        build_all_images(args.jobs, args.cache_dir, args.mirror, force=args.force, cds=args.cds, slim=args.slim)
+        if args.export:
+            export_images(args.export, args.slim)
@@ -2,6 +2,35 @@
 
 FILES_LIMIT=1048576
 ERR_OTHER=2
+CGROUP=/sys/fs/cgroup
+
+cgroup_usage() {
+  local user system written
+  if [ -f $CGROUP/cpu.stat ]; then
+    user=$(awk '$1 == "user_usec" {print $2}' $CGROUP/cpu.stat)
+    system=$(awk '$1 == "system_usec" {print $2}' $CGROUP/cpu.stat)
+    written=$(grep -o 'wbytes=[0-9]*' $CGROUP/io.stat 2>/dev/null | awk -F= '{s += $2} END {printf "%.0f", s}')
+  elif [ -f $CGROUP/cpuacct/cpuacct.usage_user ]; then
+    user=$(( $(cat $CGROUP/cpuacct/cpuacct.usage_user) / 1000 ))
+    system=$(( $(cat $CGROUP/cpuacct/cpuacct.usage_sys) / 1000 ))
+    written=$(awk '$2 == "Write" {s += $3} END {printf "%.0f", s}' $CGROUP/blkio/blkio.throttle.io_service_bytes)
+  fi
+  echo "${user:-0} ${system:-0} ${written:-0}"
+}
+
+peak_memory() {
+  cat $CGROUP/memory.peak 2>/dev/null || cat $CGROUP/memory/memory.max_usage_in_bytes 2>/dev/null
+}
+
+# cgroup v2 resets memory.peak only for the file descriptor that wrote to it, so only v1 can be reset here
+reset_peak_memory() {
+  [ -f $CGROUP/memory/memory.max_usage_in_bytes ] && echo 0 2>/dev/null > $CGROUP/memory/memory.max_usage_in_bytes
+}
+
+read -r user_start system_start written_start <<< "$(cgroup_usage)"
+if [ "${POOLED:-0}" = 1 ] && ! reset_peak_memory; then
+  peak_unknown=1
+fi
 
 if [ "$(ulimit -n)" -gt $FILES_LIMIT ]; then
   ulimit -n $FILES_LIMIT || exit $ERR_OTHER
@@ -16,10 +45,35 @@ if [ ! -d "$PROJECT_SRC" ]; then
   exit $ERR_OTHER
 fi
 
-cp -r "$PROJECT_SRC/." . || exit $ERR_OTHER
+staging_start=$(date +%s%N)
+case "${STAGING:-copy}" in
+  copy | tmpfs)
+    cp -r "$PROJECT_SRC/." . || exit $ERR_OTHER ;;
+  overlay)
+    mkdir -p "$OVERLAY_DIR/upper" "$OVERLAY_DIR/work" || exit $ERR_OTHER
+    options="lowerdir=$PROJECT_SRC,upperdir=$OVERLAY_DIR/upper,workdir=$OVERLAY_DIR/work"
+    mount -t overlay overlay -o "$options" "$PWD" && cd "$PWD" || exit $ERR_OTHER ;;
+  *)
+    echo "Unknown staging mode $STAGING"
+    exit $ERR_OTHER
+esac
+
+if [ -d "$REPORT_DIR" ]; then
+  echo "staging_ns=$(( $(date +%s%N) - staging_start ))" > "$REPORT_DIR/report"
+fi
 
 builder=$1
 
+cds_archive=/opt/cds/$builder.jsa
+if [ "${USE_CDS:-0}" = 1 ] && [ -f "$cds_archive" ]; then
+  cds_options="-XX:SharedArchiveFile=$cds_archive -Xlog:cds*=off"
+  case "$builder" in
+    gradle) export GRADLE_OPTS="$cds_options $GRADLE_OPTS" ;;
+    mvn) export MAVEN_OPTS="$cds_options $MAVEN_OPTS" ;;
+    ant) export ANT_OPTS="$cds_options $ANT_OPTS" ;;
+  esac
+fi
+
 case "$builder" in
   gradlew | mvnw | antw)
     builder="bash ./$builder"
@@ -31,10 +85,27 @@ case "$1" in
   mvn | mvnw)
     command="$builder clean package -DskipTests --errors --batch-mode" ;;
   ant | antw)
-    command="$builder clean; $builder jar || $builder war || $builder dist || $builder -verbose" ;;
+    if [ $# -gt 1 ]; then
+      command="$builder ${*:2}"
+    else
+      command="$builder clean; $builder jar || $builder war || $builder dist || $builder -verbose"
+    fi ;;
   *)
-    echo "Usage: $0 gradle|gradlew|..."
+    echo "Usage: $0 gradle|gradlew|... [ant_target...]"
     exit $ERR_OTHER
 esac
 
 timeout -k1m 1h bash -c "$command" </dev/null 2>&1
+exitcode=$?
+
+if [ -d "$REPORT_DIR" ]; then
+  read -r user system written <<< "$(cgroup_usage)"
+  {
+    echo "user_usec=$(( user - user_start ))"
+    echo "system_usec=$(( system - system_start ))"
+    echo "written_bytes=$(( written - written_start ))"
+    [ -z "$peak_unknown" ] && peak=$(peak_memory) && echo "peak_memory_bytes=$peak"
+  } >> "$REPORT_DIR/report"
+fi
+
+exit $exitcode
@@ -0,0 +1,167 @@
+from http.client import HTTPConnection, HTTPException
+from json import dumps, loads
+from os import environ
+from socket import AF_UNIX, SOCK_STREAM, socket
+from struct import unpack
+from threading import local
+from urllib.parse import quote, urlencode
+
+DEFAULT_SOCKET = '/var/run/docker.sock'
+API_VERSION = 'v1.41'
+STREAM_HEADER_SIZE = 8
+
+class EngineError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"Docker Engine API error {status}: {message}")
+        self.status = status
+
+class UnixConnection(HTTPConnection):
+    def __init__(self, socket_path):
+        super().__init__('localhost')
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket(AF_UNIX, SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+class Engine:
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.connections = local()
+
+    def ping(self):
+        return self.request('GET', '/_ping') == b'OK'
+
+    def volume_exists(self, name):
+        try:
+            self.request('GET', f'/volumes/{quote(name)}')
+            return True
+        except EngineError as e:
+            if e.status == 404:
+                return False
+            raise
+
+    def remove_volume(self, name, missing_ok=False):
+        try:
+            self.request('DELETE', f'/volumes/{quote(name)}')
+        except EngineError as e:
+            if not (missing_ok and e.status == 404):
+                raise
+
+    def list_volumes(self, name_filter):
+        query = urlencode({'filters': dumps({'name': [name_filter]})})
+        return [volume['Name'] for volume in loads(self.request('GET', f'/volumes?{query}'))['Volumes'] or []]
+
+    def image_id(self, image):
+        try:
+            return loads(self.request('GET', f"/images/{quote(image, safe='/:')}/json"))['Id']
+        except EngineError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def run_container(self, name, image, command, mounts, output, env=(), host_config=None):
+        container = self.create_container(name, image, command, mounts, env, host_config)
+        try:
+            self.start_container(container)
+            self.stream_logs(container, output)
+            return self.wait_container(container)
+        finally:
+            self.remove_container(container)
+
+    def create_container(self, name, image, command, mounts, env=(), host_config=None):
+        config = {'Image': image, 'Cmd': list(command), 'Env': list(env),
+                  'AttachStdout': True, 'AttachStderr': True,
+                  'HostConfig': {'Mounts': mounts, **(host_config or {})}}
+        path = '/containers/create?' + urlencode({'name': name})
+        try:
+            return loads(self.request('POST', path, config))['Id']
+        except EngineError as e:
+            if e.status == 409:
+                self.remove_container(name)
+            elif e.status == 404:
+                self.pull_image(image)
+            else:
+                raise
+        return loads(self.request('POST', path, config))['Id']
+
+    def pull_image(self, image):
+        repository, tag = image.rsplit(':', 1)
+        self.request('POST', '/images/create?' + urlencode({'fromImage': repository, 'tag': tag}))
+
+    def start_container(self, container):
+        self.request('POST', f'/containers/{quote(container)}/start')
+
+    def stream_logs(self, container, output):
+        query = urlencode({'follow': 1, 'stdout': 1, 'stderr': 1})
+        response = self.send('GET', f'/containers/{quote(container)}/logs?{query}')
+        while header := read_exactly(response, STREAM_HEADER_SIZE):
+            _stream, size = unpack('>BxxxL', header)
+            output.write(read_exactly(response, size))
+            output.flush()
+
+    def wait_container(self, container):
+        return loads(self.request('POST', f'/containers/{quote(container)}/wait'))['StatusCode']
+
+    def stop_container(self, container, timeout):
+        try:
+            self.request('POST', f'/containers/{quote(container)}/stop?' + urlencode({'t': timeout}))
+        except EngineError as e:
+            if e.status not in (304, 404):
+                raise
+
+    def list_containers(self, name_filter):
+        query = urlencode({'all': 1, 'filters': dumps({'name': [name_filter]})})
+        containers = loads(self.request('GET', f'/containers/json?{query}'))
+        return [container['Names'][0].lstrip('/') for container in containers]
+
+    def remove_container(self, container):
+        try:
+            self.request('DELETE', f'/containers/{quote(container)}?force=1')
+        except EngineError as e:
+            if e.status != 404:
+                raise
+
+    def request(self, method, path, body=None):
+        return self.send(method, path, body).read()
+
+    def send(self, method, path, body=None):
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        data = None if body is None else dumps(body).encode()
+        connection = self.get_connection()
+        try:
+            connection.request(method, f'/{API_VERSION}{path}', data, headers)
+            response = connection.getresponse()
+        except (ConnectionError, HTTPException):
+            connection.close()
+            connection.request(method, f'/{API_VERSION}{path}', data, headers)
+            response = connection.getresponse()
+
+        if response.status >= 300:
+            message = response.read().decode(errors='replace').strip()
+            raise EngineError(response.status, message)
+        return response
+
+    def get_connection(self):
+        if not hasattr(self.connections, 'connection'):
+            self.connections.connection = UnixConnection(self.socket_path)
+        return self.connections.connection
+
+def read_exactly(response, size):
+    data = response.read(size)
+    while data and len(data) < size:
+        chunk = response.read(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+def connect_engine():
+    docker_host = environ.get('DOCKER_HOST', 'unix://' + DEFAULT_SOCKET)
+    if not docker_host.startswith('unix://'):
+        return None
+    engine = Engine(docker_host.removeprefix('unix://'))
+    try:
+        return engine if engine.ping() else None
+    except (OSError, HTTPException, EngineError):
+        return None
@@ -1,29 +1,146 @@
 #!/usr/bin/env python3
+from concurrent.futures import ThreadPoolExecutor
+from csv import reader, writer
+from os import replace
 from pathlib import Path
-from sys import argv, path
+from shutil import move
+from sys import argv, exit, path
+from numpy import array, savez, uint8
 path.insert(1, str(Path(__file__).resolve().parent.parent))
-from common import RESULTS_CSV
+from common import METRICS_CSV, RESULTS_COLUMNAR, RESULTS_CSV
 
-def join_results(source_dirs, target_dir):
+JOURNAL_FILE = 'journal.csv'
+MOVE_JOBS = 8
+KEY_FIELDS = {RESULTS_CSV: ['name'], METRICS_CSV: ['name', 'jdk']}
+EXITCODE_PREFIX = 'java'
+
+def join_results(source_dirs, target_dir, jobs=MOVE_JOBS):
     target_dir.mkdir(parents=True, exist_ok=True)
+    for csv_name in KEY_FIELDS:
+        check_headers([source_dir / csv_name for source_dir in source_dirs], target_dir / csv_name)
+
+    conflicts = []
+    merged = {}
+    incomplete = set()
+    for csv_name, key_fields in KEY_FIELDS.items():
+        target = target_dir / csv_name
+        seen = read_fingerprints(target, key_fields) if target.is_file() else {}
+        for source_dir in source_dirs:
+            if (source_dir / csv_name).is_file():
+                skipped = merge_csv(source_dir / csv_name, target, key_fields, seen)
+                if skipped:
+                    incomplete.add(source_dir / csv_name)
+                conflicts += skipped
+        merged[csv_name] = seen
 
+    conflicts += move_logs(source_dirs, target_dir, jobs)
     for source_dir in source_dirs:
-        append_csv(source_dir / RESULTS_CSV, target_dir / RESULTS_CSV)
-        (source_dir / RESULTS_CSV).unlink()
-        move_logs(source_dir, target_dir)
+        remove_merged_files(source_dir, {name for name, in merged[RESULTS_CSV]}, incomplete)
+    write_columnar(target_dir / RESULTS_CSV, target_dir / RESULTS_COLUMNAR)
+
+    for conflict in conflicts:
+        print(conflict)
+    return conflicts
+
+def check_headers(sources, target):
+    headers = {csv: read_header(csv) for csv in [target, *sources] if csv.is_file()}
+    if len(set(headers.values())) > 1:
+        print("Header mismatch:", *(f"{csv}: {','.join(header)}" for csv, header in headers.items()), sep='\n')
+        exit(1)
+
+def read_header(csv):
+    with open(csv, newline='') as in_file:
+        return tuple(next(reader(in_file), ()))
+
+def read_fingerprints(csv, key_fields):
+    with open(csv, newline='') as in_file:
+        rows = reader(in_file)
+        keys = [i for i, field in enumerate(next(rows)) if field in key_fields]
+        return {tuple(row[i] for i in keys): hash(tuple(row)) for row in rows if row}
+
+def merge_csv(source, target, key_fields, seen):
+    conflicts = []
+    with open(source, newline='') as in_file, open(target, 'a', newline='') as out_file:
+        rows = reader(in_file)
+        header = next(rows)
+        keys = [i for i, field in enumerate(header) if field in key_fields]
+        exitcodes = [i for i, field in enumerate(header) if field.startswith(EXITCODE_PREFIX)]
+        out_csv = writer(out_file, lineterminator='\n')
+        if out_file.tell() == 0:
+            out_csv.writerow(header)
+
+        for line, row in enumerate(rows, 2):
+            if not row:
+                continue
+            if len(row) != len(header) or not all(is_exitcode(row[i]) for i in exitcodes):
+                conflicts.append(f"Invalid row {line} in {source} skipped")
+                continue
+            key = tuple(row[i] for i in keys)
+            if key not in seen:
+                seen[key] = hash(tuple(row))
+                out_csv.writerow(row)
+            elif seen[key] != hash(tuple(row)):
+                conflicts.append(f"Conflicting row {','.join(key)} in {source} skipped, the first one was kept")
+    return conflicts
+
+def is_exitcode(value):
+    return value.isdigit() and int(value) < 256
+
+def move_logs(source_dirs, target_dir, jobs=MOVE_JOBS):
+    conflicts = []
+    moves = {}
+    for source_dir in source_dirs:
+        for item in sorted(source_dir.iterdir()):
+            if item.is_dir():
+                target = target_dir / item.name
+                if target in moves or target.exists():
+                    conflicts.append(f"Log directory {item} left in place, {target} exists")
+                else:
+                    moves[target] = item
+
+    with ThreadPoolExecutor(jobs) as executor:
+        list(executor.map(move, moves.values(), moves.keys()))
+    return conflicts
+
+def remove_merged_files(source_dir, merged_names, incomplete=()):
+    for csv_name in KEY_FIELDS:
+        if source_dir / csv_name not in incomplete:
+            (source_dir / csv_name).unlink(missing_ok=True)
+    journal = source_dir / JOURNAL_FILE
+    if journal.is_file() and read_names(journal) <= merged_names:
+        journal.unlink()
+    if any(source_dir.iterdir()):
+        print(f"Directory {source_dir} is not empty, leaving it in place")
+    else:
         source_dir.rmdir()
 
-def append_csv(source, target):
-    with open(source, 'r') as in_csv, open(target, 'a') as out_csv:
-        if out_csv.tell() != 0:
-            _skip_header = in_csv.readline()
-        for line in in_csv:
-            out_csv.write(line.rstrip() + '\n')
-
-def move_logs(source_dir, target_dir):
-    for item in source_dir.iterdir():
-        if item.is_dir():
-            item.rename(target_dir / item.name)
+def read_names(csv):
+    with open(csv, newline='') as in_file:
+        rows = reader(in_file)
+        name = next(rows).index('name')
+        return {row[name] for row in rows if row}
+
+def write_columnar(results_csv, columnar_path):
+    with open(results_csv, newline='') as in_file:
+        rows = reader(in_file)
+        header = next(rows)
+        exitcode_fields = [field for field in header if field.startswith(EXITCODE_PREFIX)]
+        text_fields = [field for field in header if field not in exitcode_fields]
+        text_columns = {field: [] for field in text_fields}
+        exitcodes = []
+        for row in filter(None, rows):
+            values = dict(zip(header, row))
+            for field in text_fields:
+                text_columns[field].append(values[field])
+            exitcodes.append([int(values[field]) for field in exitcode_fields])
+
+    temp_path = columnar_path.with_name(columnar_path.name + '.tmp')
+    with open(temp_path, 'wb') as out_file:
+        savez(out_file, fields=array(header, dtype=str), text_fields=array(text_fields, dtype=str),
+              exitcode_fields=array(exitcode_fields, dtype=str),
+              exitcodes=array(exitcodes, dtype=uint8).reshape(len(exitcodes), len(exitcode_fields)),
+              **{field: array(values, dtype=str) for field, values in text_columns.items()})
+    replace(temp_path, columnar_path)
 
 if __name__ == '__main__':
     if len(argv) >= 3:
@@ -0,0 +1,62 @@
+from csv import DictReader, DictWriter
+from os import fsync
+from threading import Lock
+from time import monotonic
+
+class Journal:
+    def __init__(self, path, fields, batch_size=16, batch_seconds=5.0):
+        self.fields = fields
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self.records = {}
+        self.lock = Lock()
+        self.pending = 0
+        self.synced_at = monotonic()
+
+        truncate_torn_record(path)
+        self.file = open(path, 'a+', newline='')
+        self.file.seek(0)
+        for record in DictReader(self.file):
+            self.records[(record['name'], int(record['jdk']))] = record
+        self.writer = DictWriter(self.file, fields)
+        if self.file.tell() == 0:
+            self.writer.writeheader()
+
+    def completed(self, name):
+        with self.lock:
+            return {jdk: record for (n, jdk), record in self.records.items() if n == name}
+
+    def append(self, record):
+        with self.lock:
+            self.writer.writerow(record)
+            self.file.flush()
+            self.records[(record['name'], int(record['jdk']))] = record
+            self.pending += 1
+            if self.pending >= self.batch_size or monotonic() - self.synced_at >= self.batch_seconds:
+                self.sync()
+
+    def sync(self):
+        fsync(self.file.fileno())
+        self.pending = 0
+        self.synced_at = monotonic()
+
+    def close(self):
+        with self.lock:
+            if self.pending:
+                self.sync()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+def truncate_torn_record(path):
+    try:
+        with open(path, 'rb+') as file:
+            content = file.read()
+            if content and not content.endswith(b'\n'):
+                file.truncate(content.rfind(b'\n') + 1)
+    except FileNotFoundError:
+        pass
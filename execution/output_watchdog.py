@@ -0,0 +1,54 @@
+from re import compile
+from threading import Event, Lock, Thread
+from time import monotonic
+
+MAX_LINE_LENGTH = 65536
+
+class Watchdog:
+    def __init__(self, output, stop, silence_seconds=None, patterns=(), pattern_silence_seconds=60.0):
+        self.output = output
+        self.stop = stop
+        self.silence_seconds = silence_seconds
+        self.patterns = [compile(pattern.encode()) for pattern in patterns]
+        self.pattern_silence_seconds = pattern_silence_seconds
+        self.check_seconds = min([1.0, *(s / 10 for s in (silence_seconds, pattern_silence_seconds) if s)])
+        self.lock = Lock()
+        self.finished = Event()
+        self.last_output = monotonic()
+        self.partial_line = b''
+        self.matched = None
+        self.fired = None
+        self.thread = Thread(target=self.watch, daemon=True)
+
+    def write(self, data):
+        self.output.write(data)
+        with self.lock:
+            self.last_output = monotonic()
+            if self.patterns and self.matched is None:
+                lines = (self.partial_line + data).split(b'\n')
+                self.partial_line = lines.pop()[-MAX_LINE_LENGTH:]
+                self.matched = next((p.pattern.decode() for line in lines for p in self.patterns if p.search(line)),
+                                    None)
+
+    def flush(self):
+        self.output.flush()
+
+    def watch(self):
+        while not self.finished.wait(self.check_seconds):
+            with self.lock:
+                silent = monotonic() - self.last_output
+                if self.matched is not None and silent >= self.pattern_silence_seconds:
+                    self.fired = f'pattern:{self.matched}'
+                elif self.silence_seconds is not None and silent >= self.silence_seconds:
+                    self.fired = 'silence'
+            if self.fired is not None:
+                self.stop()
+                return
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self.finished.set()
+        self.thread.join()
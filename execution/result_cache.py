@@ -0,0 +1,45 @@
+from hashlib import sha256
+from json import dumps, loads
+from os import replace
+from shutil import copyfile
+from threading import Lock
+
+class ResultCache:
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, log_file):
+        cached = None if key is None else self.read(key, log_file)
+        with self.lock:
+            if cached is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return cached
+
+    def read(self, key, log_file):
+        entry = self.get_entry_path(key)
+        try:
+            record = loads((entry / 'result.json').read_text())
+            copyfile(entry / 'log', log_file.with_suffix('.pass' if record['exitcode'] == 0 else '.fail'))
+        except FileNotFoundError:
+            return None
+        return record['exitcode'], record['metrics']
+
+    def put(self, key, exitcode, metrics, log_file):
+        entry = self.get_entry_path(key)
+        entry.mkdir(parents=True, exist_ok=True)
+        copyfile(log_file, entry / 'log.tmp')
+        replace(entry / 'log.tmp', entry / 'log')
+        (entry / 'result.json.tmp').write_text(dumps({'exitcode': exitcode, 'metrics': metrics}))
+        replace(entry / 'result.json.tmp', entry / 'result.json')
+
+    def get_entry_path(self, key):
+        return self.directory / key[:2] / key
+
+def get_cache_key(commit, tool, wrapper, image_id, build_args=(), settings=None):
+    settings = dumps([list(build_args), settings or {}], sort_keys=True)
+    return sha256('\0'.join([commit, tool, wrapper or '', image_id, settings]).encode()).hexdigest()
@@ -1,65 +1,297 @@
 #!/usr/bin/env python3
+from argparse import ArgumentParser
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from csv import DictReader, DictWriter
+from fcntl import flock, LOCK_EX
 from logging import basicConfig, info
 from pathlib import Path
-from random import seed, shuffle
-from re import sub
+from queue import SimpleQueue
+from random import Random
+from re import fullmatch, search, sub
+from os import getpid, kill
 from signal import SIGINT, signal, SIGTERM
-from subprocess import DEVNULL, check_output, run, STDOUT
-from sys import argv, exit, path
+from socket import gethostname
+from subprocess import DEVNULL, check_output, PIPE, Popen, run, STDOUT
+from sys import exit, path
+from shutil import rmtree
+from tempfile import gettempdir
+from threading import Event, Lock
+from time import perf_counter
+from xml.etree.ElementTree import parse, ParseError
 from zlib import crc32
 path.insert(1, str(Path(__file__).resolve().parent.parent))
-from common import DOCKER_PROJECT_SRC, IMAGE_NAME, LOG_CONFIG, MAX_JAVA, MIN_JAVA, RANDOM_SEED, RESULTS_CSV, TOOLS
+from common import (DOCKER_PROJECT_SRC, IMAGE_NAME, LOG_CONFIG, MAX_JAVA, METRICS_CSV, MIN_JAVA, RANDOM_SEED,
+                    RESULTS_CSV, TOOLS, get_image)
+from docker_engine import connect_engine, Engine
+from journal import Journal
+from result_cache import get_cache_key, ResultCache
+from output_watchdog import Watchdog
+from work_queue import WorkQueue
 
 CACHE_DIRS = ['/root/.gradle/caches/modules-2/files-2.1', '/root/.gradle/wrapper/dists',
               '/root/.m2/repository', '/root/.m2/wrapper',
               '/root/.ivy2/cache']
 
-def run_builds(dataset_dir, result_dir, log_dir):
-    initialize()
-    csv_fields = ['name', 'commit', 'tool', 'wrapper'] + [f'java{v}' for v in range(MIN_JAVA, MAX_JAVA + 1)]
+BUILD_DIR = '/root/build'
+OVERLAY_DIR = '/mnt/overlay'
+REPORT_DIR = '/mnt/report'
+STAGING_DIRS = {'tmpfs': BUILD_DIR, 'overlay': OVERLAY_DIR}
+SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+METRICS_FIELDS = ['name', 'jdk', 'wall_seconds', 'user_seconds', 'system_seconds', 'peak_memory_bytes',
+                  'written_bytes', 'staging_seconds', 'watchdog']
+JOURNAL_FILE = 'journal.csv'
+JOURNAL_FIELDS = ['name', 'jdk', 'exitcode'] + METRICS_FIELDS[2:]
+
+WATCHDOG_EXITCODES = {'silence': 224, 'pattern': 225}
+ANT_TARGETS = ['jar', 'war', 'dist']
+
+POOL_DATASET = '/mnt/dataset'
+POOL_SNAPSHOT = '/var/tmp/pristine-root'
+POOL_INIT = 'trap "exit 0" TERM; while true; do sleep 3600 & wait; done'
+POOL_RESET = (f'kill -9 -1 2>/dev/null; umount {BUILD_DIR} 2>/dev/null; '
+              f'find /root /tmp -xdev -mindepth 1 -delete 2>/dev/null; '
+              f'find {BUILD_DIR} {OVERLAY_DIR} -mindepth 1 -delete 2>/dev/null; '
+              f'cp -a {POOL_SNAPSHOT}/. /root && cd {BUILD_DIR}')
+
+Options = namedtuple('Options', ['jobs', 'backend', 'docker_cli', 'staging', 'tmpfs_size', 'queue',
+                                 'stall_timeout', 'fatal_patterns', 'fatal_timeout', 'result_cache', 'manifest', 'part',
+                                 'cds', 'slim', 'lease_seconds', 'heartbeat_seconds', 'measure_pool'],
+                     defaults=[1, 'run', False, 'copy', 8 * SIZE_UNITS['g'], None, None, (), 60.0, None, None, None,
+                               False, False, 300.0, None, False])
+
+CACHED_OPTIONS = ['backend', 'staging', 'tmpfs_size', 'stall_timeout', 'fatal_patterns', 'fatal_timeout', 'cds']
+
+running_containers = set()
+pool_containers = {}
+pool_overheads = {}
+pool_savings = {}
+containers_lock = Lock()
+stopping = Event()
+engine = None
+result_cache = None
+slim_images = False
+image_ids = {}
+
+def run_builds(dataset_dir, result_dir, log_dir, options=Options()):
+    workers = get_workers(result_dir, options.jobs, shared=options.queue is not None)
+    initialize(workers, options)
+    if options.queue is not None:
+        remove_stale_workers(result_dir)
+    csv_fields = ['name', 'commit', 'tool', 'wrapper', 'target'] + [f'java{v}' for v in range(MIN_JAVA, MAX_JAVA + 1)]
     results_csv = prepare_results_csv(result_dir, csv_fields)
+    metrics_csv = prepare_results_csv(result_dir, METRICS_FIELDS, METRICS_CSV)
     log_dir.mkdir(parents=True, exist_ok=True)
     project_dirs = list_pending_projects(dataset_dir, results_csv)
+    if options.manifest is not None:
+        part_projects = read_part(options.manifest, options.part)
+        project_dirs = [p_dir for p_dir in project_dirs if get_project_name(p_dir) in part_projects]
+    journal_path = result_dir / JOURNAL_FILE
+
+    if options.queue is not None:
+        queue = WorkQueue(options.queue, options.lease_seconds, heartbeat_seconds=options.heartbeat_seconds)
+        queue.populate([get_project_name(project_dir) for project_dir in project_dirs])
+        build_from_queue(queue, dataset_dir, log_dir, workers, options,
+                         (results_csv, csv_fields, metrics_csv, METRICS_FIELDS))
+    else:
+        with (open(results_csv, 'a') as out_file, open(metrics_csv, 'a') as metrics_file,
+              Journal(journal_path, JOURNAL_FIELDS) as journal):
+            writer = DictWriter(out_file, csv_fields) # type: ignore
+            metrics_writer = DictWriter(metrics_file, METRICS_FIELDS) # type: ignore
+            for result, metrics in schedule_builds(project_dirs, log_dir, workers, options, journal):
+                metrics_writer.writerows(metrics)
+                metrics_file.flush()
+                writer.writerow(result)
+                out_file.flush()
+        journal_path.unlink()
+
+    if result_cache is not None:
+        info("Result cache: %d hits, %d misses", result_cache.hits, result_cache.misses)
+    if pool_savings:
+        info("The container pool saved about %.0f s of container overhead", sum(pool_savings.values()))
+    if pool_containers:
+        remove_pool_containers()
+        for worker in workers:
+            remove_cache_volumes(worker)
+
+def get_workers(result_dir, jobs, shared=False):
+    if shared:
+        return ['%s_%d_%d' % (get_host_id(result_dir), getpid(), slot) for slot in range(jobs)]
+    return ['%08x_%d' % (crc32(str(result_dir.resolve()).encode()), slot) for slot in range(jobs)]
+
+def get_host_id(result_dir):
+    return '%08x' % crc32(f'{result_dir.resolve()}:{gethostname()}'.encode())
+
+def remove_stale_workers(result_dir):
+    host_id = get_host_id(result_dir)
+
+    def is_stale(name):
+        match = search(rf'_{host_id}_(\d+)_\d+(_java\d+)?$', name)
+        return match is not None and not is_process_running(int(match[1]))
+
+    stale_containers = [container for container in list_containers(host_id) if is_stale(container)]
+    stale_volumes = [volume for volume in list_volumes(host_id) if is_stale(volume)]
+    stale_reports = [report_dir for report_dir in Path(gettempdir()).glob(f"{IMAGE_NAME.replace('/', '_')}_report_*")
+                     if is_stale(report_dir.name)]
+    if stale_containers or stale_volumes or stale_reports:
+        info("Removing %d containers and %d volumes of crashed workers", len(stale_containers), len(stale_volumes))
+    remove_containers(stale_containers)
+    for volume in stale_volumes:
+        remove_volume(volume)
+    for report_dir in stale_reports:
+        rmtree(report_dir, ignore_errors=True)
+
+def is_process_running(pid):
+    try:
+        kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
 
-    with open(results_csv, 'a') as out_file:
-        writer = DictWriter(out_file, csv_fields) # type: ignore
-        for project_dir in project_dirs:
-            project_name = get_project_name(project_dir)
-            result = build_project(project_name, project_dir, log_dir)
-            writer.writerow(result)
-            out_file.flush()
-            remove_cache_volumes()
+def list_containers(name_filter):
+    if engine is not None:
+        return engine.list_containers(name_filter)
+    return check_output(['docker', 'container', 'ls', '--all', f'--filter=name={name_filter}',
+                         '--format={{.Names}}'], text=True).split()
 
-def initialize():
+def list_volumes(name_filter):
+    if engine is not None:
+        return engine.list_volumes(name_filter)
+    return check_output(['docker', 'volume', 'ls', f'--filter=name={name_filter}', '--format={{.Name}}'],
+                        text=True).split()
+
+def initialize(workers, options=Options()):
+    global engine, result_cache, slim_images
     basicConfig(**LOG_CONFIG)
     for sig in (SIGINT, SIGTERM):
         signal(sig, handle_exit)
-    remove_cache_volumes()
+    engine = None if options.docker_cli else connect_engine()
+    info("Using the Docker %s", "command-line interface" if engine is None else "Engine API")
+    result_cache = None if options.result_cache is None else ResultCache(options.result_cache)
+    slim_images = options.slim
+    remove_containers([get_pool_container_name(w, v) for w in workers for v in range(MIN_JAVA, MAX_JAVA + 1)])
+    for worker in workers:
+        remove_cache_volumes(worker)
+
+def schedule_builds(project_dirs, log_dir, workers, options=Options(), journal=None):
+    idle_workers = SimpleQueue()
+    for worker in workers:
+        idle_workers.put(worker)
+
+    def build_with_idle_worker(project_dir):
+        worker = idle_workers.get()
+        try:
+            result = build_project(get_project_name(project_dir), project_dir, log_dir, worker, options, journal)
+            clear_cache_volumes(worker)
+            return result
+        finally:
+            idle_workers.put(worker)
+
+    executor = ThreadPoolExecutor(len(workers))
+    try:
+        yield from executor.map(build_with_idle_worker, project_dirs)
+    finally:
+        executor.shutdown(cancel_futures=True)
 
-def remove_cache_volumes():
+def build_from_queue(queue, dataset_dir, log_dir, workers, options, results):
+    owners = {worker: f'{gethostname()}_{worker}' for worker in workers}
+
+    def build_claimed_projects(worker):
+        while not stopping.is_set() and (project_name := queue.claim(owners[worker])) is not None:
+            project_dir = dataset_dir / project_name.replace('/', '_', 1)
+            result, _metrics = build_project(project_name, project_dir, log_dir, worker, options, queue)
+            clear_cache_volumes(worker)
+            queue.finish(project_name, result)
+            queue.write_results(*results)
+
+    queue.write_results(*results)
+    with queue.leases(owners.values()), ThreadPoolExecutor(len(workers)) as executor:
+        list(executor.map(build_claimed_projects, workers))
+
+def remove_cache_volumes(worker=''):
     for cache_dir in CACHE_DIRS:
-        volume = get_volume_name(cache_dir)
-        if run(['docker', 'volume', 'inspect', volume], stdout=DEVNULL, stderr=DEVNULL).returncode == 0:
-            run(['docker', 'volume', 'rm', volume], stdout=DEVNULL, check=True)
+        remove_volume(get_volume_name(cache_dir, worker))
+
+def remove_volume(volume):
+    if engine is not None:
+        engine.remove_volume(volume, missing_ok=True)
+    elif run(['docker', 'volume', 'inspect', volume], stdout=DEVNULL, stderr=DEVNULL).returncode == 0:
+        run(['docker', 'volume', 'rm', volume], stdout=DEVNULL, check=True)
+
+def clear_cache_volumes(worker):
+    with containers_lock:
+        containers = [c for (w, _), c in pool_containers.items() if w == worker]
+    if containers:
+        run(['docker', 'exec', containers[0], 'find', *CACHE_DIRS, '-mindepth', '1', '-delete'],
+            stdout=DEVNULL, check=True)
+    else:
+        remove_cache_volumes(worker)
+
+def get_volume_mounts(worker):
+    return [{'Type': 'volume', 'Source': get_volume_name(cache, worker), 'Target': cache} for cache in CACHE_DIRS]
+
+def get_bind_mount(source, target, readonly=True):
+    return {'Type': 'bind', 'Source': str(source.resolve()), 'Target': target, 'ReadOnly': readonly}
+
+def get_container_config(worker, options):
+    mounts = [*get_volume_mounts(worker), get_bind_mount(get_report_dir(worker), REPORT_DIR, readonly=False)]
+    env = [f'STAGING={options.staging}', f'REPORT_DIR={REPORT_DIR}', f'OVERLAY_DIR={OVERLAY_DIR}',
+           f'USE_CDS={int(options.cds)}']
+    host_config = {}
+    if options.staging in STAGING_DIRS:
+        tmpfs = {'SizeBytes': options.tmpfs_size}
+        mounts.append({'Type': 'tmpfs', 'Target': STAGING_DIRS[options.staging], 'TmpfsOptions': tmpfs})
+    if options.staging == 'overlay':
+        host_config = {'CapAdd': ['SYS_ADMIN'], 'SecurityOpt': ['apparmor=unconfined']}
+    return mounts, env, host_config
+
+def get_docker_options(mounts, env=(), host_config=None):
+    options = [f'--env={variable}' for variable in env]
+    for mount in mounts:
+        if mount['Type'] == 'tmpfs':
+            source = f",tmpfs-size={mount['TmpfsOptions']['SizeBytes']}"
+        else:
+            source = f",src={mount['Source']}" + (',readonly' if mount.get('ReadOnly') else '')
+        options.append(f"--mount=type={mount['Type']},dst={mount['Target']}{source}")
+    options += [f'--cap-add={capability}' for capability in (host_config or {}).get('CapAdd', [])]
+    options += [f'--security-opt={option}' for option in (host_config or {}).get('SecurityOpt', [])]
+    return options
+
+def get_report_dir(worker):
+    report_dir = Path(gettempdir()) / f"{IMAGE_NAME.replace('/', '_')}_report_{worker}"
+    report_dir.mkdir(exist_ok=True)
+    return report_dir
+
+def read_report(worker):
+    report_file = get_report_dir(worker) / 'report'
+    try:
+        lines = report_file.read_text().split()
+        report_file.unlink()
+    except FileNotFoundError:
+        return {}
+    return {key: int(value) for key, value in (line.split('=', 1) for line in lines)}
 
-def get_volume_name(cache_dir):
+def get_volume_name(cache_dir, worker=''):
     user_friendly_name = sub(r'\W+', '_', IMAGE_NAME + cache_dir)
     collision_prevention = crc32(cache_dir.encode())
-    return '%s_%08x' % (user_friendly_name, collision_prevention)
+    return '%s_%08x' % (user_friendly_name, collision_prevention) + (f'_{worker}' if worker else '')
 
-def prepare_results_csv(result_dir, fields):
+def prepare_results_csv(result_dir, fields, csv_name=RESULTS_CSV):
     result_dir.mkdir(parents=True, exist_ok=True)
-    csv_path = result_dir / RESULTS_CSV
+    csv_path = result_dir / csv_name
     with open(csv_path, 'a') as out_file:
-        if out_file.tell() == 0:
+        flock(out_file, LOCK_EX)
+        if out_file.seek(0, 2) == 0:
             DictWriter(out_file, fields).writeheader()  # type: ignore
     return csv_path
 
 def list_pending_projects(dataset_dir, results_csv):
     project_dirs = sorted([file for file in dataset_dir.iterdir() if file.is_dir()])
-    seed(RANDOM_SEED)
-    shuffle(project_dirs)
+    Random(RANDOM_SEED).shuffle(project_dirs)
 
     with open(results_csv, 'r') as results_file:
         reader = DictReader(results_file)
@@ -67,37 +299,121 @@ def list_pending_projects(dataset_dir, results_csv):
 
     return [p_dir for p_dir in project_dirs if get_project_name(p_dir) not in finished]
 
+def read_part(manifest_csv, part):
+    with open(manifest_csv) as manifest_file:
+        return {row['name'] for row in DictReader(manifest_file) if int(row['part']) == part}
+
 def get_project_name(project_dir):
     return project_dir.name.replace('_', '/', 1)
 
-def build_project(project_name, project_dir, log_dir):
+def build_project(project_name, project_dir, log_dir, worker='', options=Options(), journal=None):
     info("Analyzing %s", project_name)
-    builder, result = analyze_project(project_name, project_dir)
-    project_log_dir = prepare_log_dir(project_dir, log_dir)
+    build_args, result = analyze_project(project_name, project_dir)
+    completed = journal.completed(project_name) if journal else {}
+    project_log_dir = prepare_log_dir(project_dir, log_dir, completed)
 
     java_versions = list(range(MIN_JAVA, MAX_JAVA + 1))
-    seed(project_name)
-    shuffle(java_versions)
+    Random(project_name).shuffle(java_versions)
+    metrics = []
     for java_version in java_versions:
-        info("Building %s with Java %d", project_name, java_version)
-        exitcode = build_project_with_java(project_dir, java_version, builder, project_log_dir)
+        if java_version in completed:
+            info("Reusing journaled build of %s with Java %d", project_name, java_version)
+            record = completed[java_version]
+            exitcode = int(record['exitcode'])
+            build_metrics = {field: record[field] or None for field in METRICS_FIELDS[2:]}
+        else:
+            exitcode, build_metrics = build_or_reuse(project_dir, java_version, build_args, result, project_log_dir,
+                                                     worker, options)
+            if journal:
+                journal.append({'name': project_name, 'jdk': java_version, 'exitcode': exitcode} | build_metrics)
         result[f'java{java_version}'] = exitcode
+        metrics.append({'name': project_name, 'jdk': java_version} | build_metrics)
+
+    return result, metrics
+
+def build_or_reuse(project_dir, java_version, build_args, result, log_dir, worker='', options=Options()):
+    if result_cache is not None:
+        cached = result_cache.get(get_build_key(result, java_version, build_args, options),
+                                  log_dir / f'{java_version:02d}')
+        if cached is not None:
+            info("Reusing cached build of %s with Java %d", result['name'], java_version)
+            return cached
+
+    info("Building %s with Java %d", result['name'], java_version)
+    exitcode, metrics = build_project_with_java(project_dir, java_version, build_args, log_dir, worker, options)
+    if stopping.is_set():
+        exit(1)
 
-    return result
+    key = get_build_key(result, java_version, build_args, options) if result_cache is not None else None
+    if key is not None and metrics['watchdog'] is None:
+        log = log_dir / f"{java_version:02d}.{'pass' if exitcode == 0 else 'fail'}"
+        result_cache.put(key, exitcode, metrics, log)
+    return exitcode, metrics
+
+def get_build_key(result, java_version, build_args=(), options=Options()):
+    image_id = get_image_id(java_version)
+    if image_id is None:
+        return None
+    settings = {field: getattr(options, field) for field in CACHED_OPTIONS}
+    return get_cache_key(result['commit'], result['tool'], result['wrapper'], image_id, build_args, settings)
+
+def get_image_id(java_version):
+    image = get_image(java_version, slim_images)
+    if image not in image_ids:
+        if engine is not None:
+            image_id = engine.image_id(image)
+        else:
+            process = run(['docker', 'image', 'inspect', '--format={{.Id}}', image], capture_output=True, text=True)
+            image_id = process.stdout.strip() if process.returncode == 0 else None
+        if image_id is None:
+            return None
+        image_ids[image] = image_id
+    return image_ids[image]
 
 def analyze_project(project_name, project_dir):
     commit = get_commit(project_dir)
     tool = detect_tool(project_dir)
     wrapper = detect_wrapper(project_dir, tool)
-    result = {'name': project_name, 'commit': commit, 'tool': tool.name, 'wrapper': wrapper}
-    builder = tool.command if wrapper is None else wrapper
-    return builder, result
+    build_args = [tool.command if wrapper is None else wrapper]
+    target = None
+    if tool.name == 'Ant':
+        targets = get_ant_targets(project_dir / 'build.xml')
+        if targets is not None:
+            default, names = targets
+            target = next((t for t in [*ANT_TARGETS, default] if t in names and t != 'clean'), None)
+        if target is not None:
+            build_args += ['clean'] * ('clean' in names) + [target]
+    result = {'name': project_name, 'commit': commit, 'tool': tool.name, 'wrapper': wrapper, 'target': target}
+    return build_args, result
+
+def get_ant_targets(build_file, visited=None):
+    visited = set() if visited is None else visited
+    visited.add(build_file.resolve())
+    try:
+        project = parse(build_file).getroot()
+    except (OSError, ParseError):
+        return None
+
+    names = {target.get('name') for target in project.iter('target')}
+    for imported in project.iter('import'):
+        imported_file = build_file.parent / imported.get('file', '')
+        if not imported_file.is_file():
+            if imported.get('optional') == 'true':
+                continue
+            return None
+        if imported_file.resolve() not in visited:
+            imported_targets = get_ant_targets(imported_file, visited)
+            if imported_targets is None:
+                return None
+            names |= imported_targets[1]
+    return project.get('default'), names
 
-def prepare_log_dir(project_dir, log_dir):
+def prepare_log_dir(project_dir, log_dir, completed_versions=()):
     project_log_dir = log_dir / project_dir.name
     project_log_dir.mkdir(exist_ok=True)
+    kept = {f'{v:02d}.{outcome}' for v in completed_versions for outcome in ('pass', 'fail')}
     for file in project_log_dir.iterdir():
-        if file.is_file():
+        if file.is_file() and file.name not in kept:
             file.unlink()
     return project_log_dir
 
@@ -116,29 +432,216 @@ def detect_wrapper(project_dir, tool):
     else:
         return None
 
-def build_project_with_java(project_dir, java_version, builder, log_dir):
-    volumes = [f'--mount=type=volume,src={get_volume_name(cache)},dst={cache}' for cache in CACHE_DIRS]
-    command = ['docker', 'run', '--rm', '--quiet', f'--name={get_container_name()}',
-               f'--mount=type=bind,src={project_dir.resolve()},dst={DOCKER_PROJECT_SRC},readonly',
-               *volumes,
-               f'{IMAGE_NAME}:{java_version}', builder]
+def build_project_with_java(project_dir, java_version, build_args, log_dir, worker='', options=Options()):
+    if options.backend == 'pool':
+        container = get_pool_container(java_version, worker, options)
+        copy_to_pool_container(project_dir, container)
+        command = ['docker', 'exec', f'--env=PROJECT_SRC={POOL_DATASET}/{project_dir.name}', '--env=POOLED=1',
+                   container, 'bash', '-c', f'{POOL_RESET} && exec /app/run-build.sh "$0" "$@"', *build_args]
+    else:
+        container = get_container_name(worker)
+        image = get_image(java_version, options.slim)
+        mounts, env, host_config = get_container_config(worker, options)
+        mounts.insert(0, get_bind_mount(project_dir, DOCKER_PROJECT_SRC))
+        command = ['docker', 'run', '--rm', '--quiet', f'--name={container}',
+                   *get_docker_options(mounts, env, host_config), image, *build_args]
 
     log = log_dir / f'{java_version:02d}'
-    with open(log, 'w') as log_file:
-        exitcode = run(command, stdin=DEVNULL, stdout=log_file, stderr=STDOUT, bufsize=0).returncode
+    read_report(worker)
+    start = perf_counter()
+    with (open(log, 'wb') as log_file, tracked_container(container),
+          watch_output(log_file, container, options) as output):
+        if engine is not None and options.backend == 'run':
+            exitcode = engine.run_container(container, image, build_args, mounts, output, env, host_config)
+        elif output is log_file:
+            exitcode = run(command, stdin=DEVNULL, stdout=log_file, stderr=STDOUT, bufsize=0).returncode
+        else:
+            with Popen(command, stdin=DEVNULL, stdout=PIPE, stderr=STDOUT, bufsize=0) as process:
+                while chunk := process.stdout.read(65536):
+                    output.write(chunk)
+            exitcode = process.returncode
 
+    rule = output.fired if output is not log_file else None
+    if rule is not None:
+        info("Watchdog stopped the build after %s", rule)
+        exitcode = WATCHDOG_EXITCODES[rule.split(':', 1)[0]]
+    metrics = get_metrics(perf_counter() - start, read_report(worker)) | {'watchdog': rule}
+    if options.backend == 'pool' and exitcode != 0 and not is_container_running(container):
+        info("Replacing the pooled container %s, which stopped during the build", container)
+        discard_pool_container(worker, java_version)
     log.rename(log.with_suffix('.pass' if exitcode == 0 else '.fail'))
-    return exitcode
+    return exitcode, metrics
+
+def get_metrics(wall_seconds, report):
+    def seconds(key, unit):
+        return round(report[key] / unit, 3) if key in report else None
+
+    return {'wall_seconds': round(wall_seconds, 3),
+            'user_seconds': seconds('user_usec', 1e6),
+            'system_seconds': seconds('system_usec', 1e6),
+            'peak_memory_bytes': report.get('peak_memory_bytes'),
+            'written_bytes': report.get('written_bytes'),
+            'staging_seconds': seconds('staging_ns', 1e9),
+            'watchdog': None}
+
+@contextmanager
+def watch_output(log_file, container, options):
+    if options.stall_timeout is None and not options.fatal_patterns:
+        yield log_file
+        return
+
+    def stop_build():
+        if options.backend == 'pool':
+            run(['docker', 'exec', container, 'kill', '-9', '-1'], stdout=DEVNULL, stderr=DEVNULL)
+        elif engine is not None:
+            engine.stop_container(container, timeout=1)
+        else:
+            run(['docker', 'stop', '--timeout=1', container], stdout=DEVNULL, stderr=DEVNULL)
+
+    with Watchdog(log_file, stop_build, options.stall_timeout, options.fatal_patterns,
+                  options.fatal_timeout) as watchdog:
+        yield watchdog
 
-def get_container_name():
-    return IMAGE_NAME.replace('/', '_') + '_container'
+def get_container_name(worker=''):
+    return IMAGE_NAME.replace('/', '_') + '_container' + (f'_{worker}' if worker else '')
+
+def get_pool_container(java_version, worker, options):
+    container = pool_containers.get((worker, java_version))
+    if container is None:
+        container = get_pool_container_name(worker, java_version)
+        with containers_lock:
+            if stopping.is_set():
+                exit(1)
+            pool_containers[(worker, java_version)] = container
+
+        image = get_image(java_version, options.slim)
+        mounts, env, host_config = get_container_config(worker, options)
+        docker_options = get_docker_options(mounts, env, host_config)
+        run(['docker', 'run', '--detach', '--rm', '--quiet', f'--name={container}', *docker_options,
+             '--entrypoint=bash', image, '-c', POOL_INIT], stdout=DEVNULL, check=True)
+        run(['docker', 'exec', container, 'cp', '-ax', '/root', POOL_SNAPSHOT], check=True)
+        if options.measure_pool:
+            pool_overheads[(worker, java_version)] = measure_saved_overhead(container, image, docker_options)
+
+    if (worker, java_version) in pool_overheads:
+        pool_savings[worker] = pool_savings.get(worker, 0.0) + pool_overheads[(worker, java_version)]
+    return container
+
+def copy_to_pool_container(project_dir, container):
+    run(['docker', 'exec', container, 'bash', '-c', f'rm -rf {POOL_DATASET} && mkdir {POOL_DATASET}'], check=True)
+    run(['docker', 'cp', str(project_dir), f'{container}:{POOL_DATASET}/'], stdout=DEVNULL, check=True)
+
+def discard_pool_container(worker, java_version):
+    with containers_lock:
+        container = pool_containers.pop((worker, java_version), None)
+    if container is not None:
+        remove_containers([container])
+
+def is_container_running(container):
+    process = run(['docker', 'container', 'inspect', '--format={{.State.Running}}', container],
+                  capture_output=True, text=True)
+    return process.returncode == 0 and process.stdout.strip() == 'true'
+
+def get_pool_container_name(worker, java_version):
+    return f'{get_container_name(worker)}_java{java_version}'
+
+def measure_saved_overhead(container, image, docker_options):
+    start = perf_counter()
+    run(['docker', 'run', '--rm', '--quiet', *docker_options, '--entrypoint=true', image],
+        stdout=DEVNULL, stderr=DEVNULL)
+    run_overhead = perf_counter() - start
+
+    start = perf_counter()
+    run(['docker', 'exec', container, 'bash', '-c', POOL_RESET], stdout=DEVNULL, stderr=DEVNULL)
+    pool_overhead = perf_counter() - start
+
+    info("Per-build overhead of %s: %.2f s with docker run, %.2f s with the container pool",
+         image, run_overhead, pool_overhead)
+    return run_overhead - pool_overhead
+
+def remove_pool_containers():
+    with containers_lock:
+        containers = list(pool_containers.values())
+        pool_containers.clear()
+    remove_containers(containers)
+
+def remove_containers(containers):
+    if engine is not None:
+        for container in containers:
+            engine.remove_container(container)
+    elif containers:
+        run(['docker', 'rm', '--force', *containers], stdout=DEVNULL, stderr=DEVNULL)
+
+@contextmanager
+def tracked_container(container):
+    with containers_lock:
+        if stopping.is_set():
+            exit(1)
+        running_containers.add(container)
+    try:
+        yield
+    finally:
+        with containers_lock:
+            running_containers.discard(container)
 
 def handle_exit(*_):
-    run(['docker', 'stop', '--timeout=1', get_container_name()], stdout=DEVNULL, stderr=DEVNULL)
+    with containers_lock:
+        stopping.set()
+        containers = list(running_containers)
+    for container in containers:
+        if engine is not None:
+            Engine(engine.socket_path).stop_container(container, timeout=1)
+        else:
+            run(['docker', 'stop', '--timeout=1', container], stdout=DEVNULL, stderr=DEVNULL)
+    remove_pool_containers()
     exit(1)
 
+def parse_size(size):
+    match = fullmatch(r'(\d+)([kmg]?)', size.lower())
+    if not match:
+        raise ValueError(f"Invalid size {size}")
+    return int(match[1]) * SIZE_UNITS[match[2]]
+
+def parse_args():
+    parser = ArgumentParser()
+    parser.add_argument('dataset_dir', type=Path)
+    parser.add_argument('result_dir', type=Path)
+    parser.add_argument('log_dir', type=Path)
+    parser.add_argument('--jobs', type=int, default=1, help="number of builds running at once")
+    parser.add_argument('--backend', choices=['run', 'pool'], default='run',
+                        help="start a container per build, or reuse warm containers per JDK")
+    parser.add_argument('--measure-pool-overhead', dest='measure_pool', action='store_true',
+                        help="with --backend pool, start an extra container per image to log the time saved")
+    parser.add_argument('--docker-cli', action='store_true',
+                        help="run docker commands instead of using the Engine API socket")
+    parser.add_argument('--staging', choices=['copy', 'tmpfs', 'overlay'], default='copy',
+                        help="copy the project into the container, into a tmpfs, or mount it as an overlay "
+                             "with a tmpfs upper layer (needs CAP_SYS_ADMIN)")
+    parser.add_argument('--tmpfs-size', type=parse_size, default='8g', help="size limit of the tmpfs, e.g. 8g")
+    parser.add_argument('--stall-timeout', type=float, metavar='SECONDS',
+                        help="stop a build that has printed nothing for this long")
+    parser.add_argument('--fatal-pattern', dest='fatal_patterns', action='append', default=[], metavar='REGEX',
+                        help="stop a build that stays silent for --fatal-timeout after printing a matching line")
+    parser.add_argument('--fatal-timeout', type=float, default=60.0, metavar='SECONDS',
+                        help="silence tolerated after a --fatal-pattern match (default: 60)")
+    parser.add_argument('--result-cache', type=Path, metavar='DIR',
+                        help="reuse results and logs of builds with the same commit, tool, wrapper and image")
+    parser.add_argument('--queue', type=Path,
+                        help="SQLite work queue shared by all instances on this host building the same dataset into "
+                             "result_dir; it must be on a local file system")
+    parser.add_argument('--lease-timeout', dest='lease_seconds', type=float, default=300.0, metavar='SECONDS',
+                        help="time after which the project of a crashed --queue worker is taken over (default: 300)")
+    parser.add_argument('--heartbeat', dest='heartbeat_seconds', type=float, metavar='SECONDS',
+                        help="interval of renewing the --queue leases (default: a third of --lease-timeout)")
+    parser.add_argument('--manifest', type=Path, metavar='CSV',
+                        help="build only the projects assigned to --part by split-dataset.py --manifest")
+    parser.add_argument('--part', type=int, default=1, help="part of the manifest to build (default: 1)")
+    parser.add_argument('--cds', action='store_true',
+                        help="use the class data sharing archives of the build tools in images built with --cds")
+    parser.add_argument('--slim', action='store_true', help="build in the slim images made by build-images.py --slim")
+    args = parser.parse_args()
+    return args, Options(*(getattr(args, field) for field in Options._fields))
+
 if __name__ == '__main__':
-    if len(argv) == 4:
-        run_builds(Path(argv[1]), Path(argv[2]), Path(argv[3]))
-    else:
-        print("Usage: %s <dataset_dir> <result_dir> <log_dir>" % Path(__file__).name)
+    args, options = parse_args()
+    run_builds(args.dataset_dir, args.result_dir, args.log_dir, options)
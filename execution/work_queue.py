@@ -0,0 +1,144 @@
+from contextlib import contextmanager
+from csv import DictReader, DictWriter
+from fcntl import flock, LOCK_EX, LOCK_UN
+from json import dumps, loads
+from os import fsync
+from sqlite3 import connect
+from threading import Event, local, Thread
+from time import sleep, time
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS projects (
+    name TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    owner TEXT,
+    lease_expires REAL,
+    done INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    written INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS cells (
+    name TEXT NOT NULL,
+    jdk INTEGER NOT NULL,
+    record TEXT NOT NULL,
+    PRIMARY KEY (name, jdk)
+);
+'''
+
+class WorkQueue:
+    def __init__(self, path, lease_seconds=300.0, poll_seconds=1.0, heartbeat_seconds=None):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.heartbeat_seconds = lease_seconds / 3 if heartbeat_seconds is None else heartbeat_seconds
+        if self.heartbeat_seconds >= lease_seconds:
+            raise ValueError(f"Heartbeat interval {self.heartbeat_seconds} s must be shorter than the lease")
+        self.connections = local()
+        self.checked_results = False
+        self.connection().executescript(SCHEMA)
+
+    def populate(self, names, finished_names=()):
+        with self.transaction() as db:
+            offset = db.execute('SELECT COUNT(*) FROM projects').fetchone()[0]
+            db.executemany('INSERT OR IGNORE INTO projects (name, position) VALUES (?, ?)',
+                           ((name, offset + i) for i, name in enumerate(names)))
+            db.executemany('UPDATE projects SET done = 1 WHERE name = ?', ((name,) for name in finished_names))
+
+    def claim(self, owner):
+        while True:
+            with self.transaction() as db:
+                row = db.execute('SELECT name FROM projects WHERE done = 0 AND '
+                                 '(owner IS NULL OR owner = ? OR lease_expires < ?) ORDER BY position LIMIT 1',
+                                 (owner, time())).fetchone()
+                if row is not None:
+                    db.execute('UPDATE projects SET owner = ?, lease_expires = ? WHERE name = ?',
+                               (owner, time() + self.lease_seconds, row[0]))
+                    return row[0]
+                if db.execute('SELECT COUNT(*) FROM projects WHERE done = 0').fetchone()[0] == 0:
+                    return None
+            sleep(self.poll_seconds)
+
+    def completed(self, name):
+        rows = self.connection().execute('SELECT jdk, record FROM cells WHERE name = ?', (name,))
+        return {jdk: loads(record) for jdk, record in rows}
+
+    def append(self, record):
+        with self.transaction() as db:
+            db.execute('INSERT OR IGNORE INTO cells (name, jdk, record) VALUES (?, ?, ?)',
+                       (record['name'], record['jdk'], dumps(record)))
+
+    def finish(self, name, result):
+        with self.transaction() as db:
+            db.execute('UPDATE projects SET done = 1, owner = NULL, result = ? WHERE name = ? AND done = 0',
+                       (dumps(result), name))
+
+    def renew(self, owners):
+        with self.transaction() as db:
+            db.executemany('UPDATE projects SET lease_expires = ? WHERE owner = ? AND done = 0',
+                           ((time() + self.lease_seconds, owner) for owner in owners))
+
+    def release(self, owners):
+        with self.transaction() as db:
+            db.executemany('UPDATE projects SET owner = NULL, lease_expires = NULL WHERE owner = ?',
+                           ((owner,) for owner in owners))
+
+    @contextmanager
+    def leases(self, owners):
+        stopped = Event()
+
+        def renew_periodically():
+            while not stopped.wait(self.heartbeat_seconds):
+                self.renew(owners)
+
+        heartbeat = Thread(target=renew_periodically, daemon=True)
+        heartbeat.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+            heartbeat.join()
+            self.release(owners)
+
+    def write_results(self, results_csv, result_fields, metrics_csv, metrics_fields):
+        with open(results_csv, 'a+', newline='') as results_file, open(metrics_csv, 'a', newline='') as metrics_file:
+            flock(results_file, LOCK_EX)
+            try:
+                rows = self.connection().execute('SELECT name, result FROM projects WHERE done = 1 AND written = 0 '
+                                                 'AND result IS NOT NULL ORDER BY position').fetchall()
+                written = set()
+                if rows and not self.checked_results:
+                    results_file.seek(0)
+                    written = {row['name'] for row in DictReader(results_file)}
+                    self.checked_results = True
+                results_writer = DictWriter(results_file, result_fields)
+                metrics_writer = DictWriter(metrics_file, metrics_fields, extrasaction='ignore')
+                for name, result in rows:
+                    if name not in written:
+                        cells = self.completed(name)
+                        metrics_writer.writerows(cells[jdk] for jdk in sorted(cells))
+                        results_writer.writerow(loads(result))
+                for file in (metrics_file, results_file):
+                    file.flush()
+                    fsync(file.fileno())
+                with self.transaction() as db:
+                    db.executemany('UPDATE projects SET written = 1 WHERE name = ?', ((name,) for name, _ in rows))
+            finally:
+                flock(results_file, LOCK_UN)
+
+    @contextmanager
+    def transaction(self):
+        db = self.connection()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+
+    def connection(self):
+        if not hasattr(self.connections, 'db'):
+            self.connections.db = connect(self.path, timeout=60, isolation_level=None)
+            self.connections.db.execute('PRAGMA journal_mode=WAL')
+            self.connections.db.execute('PRAGMA synchronous=NORMAL')
+        return self.connections.db
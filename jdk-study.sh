@@ -19,12 +19,13 @@ script_dir=$(dirname "$(realpath "$0")")
 [ "$(ls "$data_dir")" = "github.csv" ] || { echo "$data_dir should contain exactly one file: github.csv"; exit 1; }
 
 "$script_dir/dataset/create-dataset.py" "$data_dir/github.csv" "$data_dir/projects" "$project_count" || exit 1
-tar cJf "$data_dir/projects.tar.xz" -C "$data_dir" projects
+[ -z "$DEDUP" ] || "$script_dir/dataset/dedup-dataset.py" "$data_dir/projects" "$data_dir/store" || exit 1
+"$script_dir/seekable_archive.py" create "$data_dir/projects.xza" "$data_dir/projects" || exit 1
 
 "$script_dir/environment/build-images.py" || exit 1
 
 "$script_dir/execution/run-builds.py" "$data_dir/projects" "$data_dir" "$data_dir/logs" || exit 1
-tar cJf "$data_dir/logs.tar.xz" -C "$data_dir" logs
+"$script_dir/seekable_archive.py" create "$data_dir/logs.xza" "$data_dir/logs" || exit 1
 
 for notebook in "$script_dir"/results/{general,projects,jdks,tools}.py; do
   marimo edit "$notebook" "$data_dir" "$data_dir/out" &
@@ -0,0 +1,140 @@
+from array import array
+from bisect import bisect_left
+from collections import deque
+from csv import DictReader, DictWriter, reader
+from hashlib import blake2b
+from io import StringIO
+from os import replace, stat
+from pathlib import Path
+from struct import calcsize, error as StructError, pack, unpack
+
+INDEX_SUFFIX = '.idx'
+INDEX_MAGIC = b'JDKIDX1\n'
+INDEX_HEADER = '<QQQQc'
+HASH_BUCKET_BITS = 8
+
+class MetadataStore:
+    def __init__(self, csv_path):
+        self.csv_path = Path(csv_path)
+        self.index_path = self.csv_path.with_name(self.csv_path.name + INDEX_SUFFIX)
+        if not self.load_index():
+            self.build_index()
+            self.load_index()
+        self.file = open(self.csv_path, encoding='utf-8', errors='replace', newline='')
+        self.header = next(reader(self.file))
+
+    def offsets(self, predicate=None):
+        self.file.seek(self.header_end)
+        rows = DictReader(self.file, self.header)
+        return array(self.row_offsets.typecode, (offset for offset, row in zip(self.row_offsets, rows)
+                                                 if predicate is None or predicate(row)))
+
+    def row_at(self, offset):
+        self.file.seek(offset)
+        return next(DictReader(self.file, self.header))
+
+    def lookup(self, name, columns=None):
+        row_number = self.find(name)
+        if row_number is None:
+            return None
+        row = self.row_at(self.row_offsets[row_number])
+        return row if columns is None else {column: row[column] for column in columns}
+
+    def extract(self, names, columns=None):
+        output = StringIO()
+        writer = DictWriter(output, columns or self.header, extrasaction='ignore')
+        writer.writeheader()
+        for name in names:
+            row = self.lookup(name, columns)
+            if row is not None:
+                writer.writerow(row)
+        return output.getvalue()
+
+    def find(self, name):
+        name_hash = get_name_hash(name)
+        i = bisect_left(self.name_hashes, name_hash)
+        while i < len(self.name_hashes) and self.name_hashes[i] == name_hash:
+            if self.row_at(self.row_offsets[self.name_rows[i]])['name'] == name:
+                return self.name_rows[i]
+            i += 1
+        return None
+
+    def load_index(self):
+        csv_stat = stat(self.csv_path)
+        try:
+            with open(self.index_path, 'rb') as index_file:
+                if index_file.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                    return False
+                size, mtime, self.header_end, count, typecode = unpack(INDEX_HEADER,
+                                                                        index_file.read(calcsize(INDEX_HEADER)))
+                if (size, mtime) != (csv_stat.st_size, csv_stat.st_mtime_ns) or typecode not in (b'I', b'Q'):
+                    return False
+                self.row_offsets = array(typecode.decode())
+                self.row_offsets.fromfile(index_file, count)
+                self.name_hashes = array('Q')
+                self.name_hashes.fromfile(index_file, count)
+                self.name_rows = array('I')
+                self.name_rows.fromfile(index_file, count)
+                return not index_file.read(1)
+        except (FileNotFoundError, EOFError, StructError, ValueError):
+            return False
+
+    def build_index(self):
+        csv_stat = stat(self.csv_path)
+        row_offsets = array('I' if csv_stat.st_size < 2 ** 32 else 'Q')
+        name_hashes = array('Q')
+        with open(self.csv_path, 'rb') as csv_file:
+            records = read_records(csv_file)
+            name_column = next(records)[1].index('name')
+            for offset, row in records:
+                row_offsets.append(offset)
+                name_hashes.append(get_name_hash(row[name_column] if name_column < len(row) else ''))
+        header_end = row_offsets[0] if row_offsets else csv_stat.st_size
+
+        order = sort_by_hash(name_hashes)
+        temp_path = self.index_path.with_name(self.index_path.name + '.tmp')
+        with open(temp_path, 'wb') as index_file:
+            index_file.write(INDEX_MAGIC)
+            index_file.write(pack(INDEX_HEADER, csv_stat.st_size, csv_stat.st_mtime_ns, header_end,
+                                  len(row_offsets), row_offsets.typecode.encode()))
+            row_offsets.tofile(index_file)
+            array('Q', (name_hashes[i] for i in order)).tofile(index_file)
+            order.tofile(index_file)
+        replace(temp_path, self.index_path)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+def read_records(csv_file):
+    line_offsets = deque()
+
+    def lines():
+        offset = 0
+        for line in csv_file:
+            line_offsets.append(offset)
+            offset += len(line)
+            yield line.decode(errors='replace')
+
+    for row in reader(lines()):
+        offset = line_offsets[0]
+        line_offsets.clear()
+        if row:
+            yield offset, row
+
+def sort_by_hash(name_hashes):
+    buckets = [array('I') for _ in range(2 ** HASH_BUCKET_BITS)]
+    for row, name_hash in enumerate(name_hashes):
+        buckets[name_hash >> (64 - HASH_BUCKET_BITS)].append(row)
+    order = array('I')
+    for bucket in buckets:
+        order.extend(sorted(bucket, key=name_hashes.__getitem__))
+    return order
+
+def get_name_hash(name):
+    return int.from_bytes(blake2b(name.encode(), digest_size=8).digest(), 'little')
@@ -7,13 +7,14 @@ with app.setup:
     import marimo as mo
     from altair import Chart, Color, Scale, Text, Y
     from marimo import md
+    from numpy import load, nan
     from pandas import DataFrame, read_csv
     from pandas.testing import assert_frame_equal
     from pathlib import Path
     from pymannkendall import original_test
     from sys import path
     path.insert(1, str(Path(globals()['__file__']).resolve().parent / '..'))
-    from common import exit_notebook, require_path_args, RESULTS_CSV
+    from common import exit_notebook, require_path_args, RESULTS_COLUMNAR, RESULTS_CSV
 
 
 @app.cell(hide_code=True)
@@ -34,7 +35,20 @@ def _():
 
 @app.function
 def get_results(results_csv):
-    return read_csv(results_csv).set_index('name').sort_index()
+    columnar = Path(results_csv).with_name(RESULTS_COLUMNAR)
+    if columnar.is_file() and columnar.stat().st_mtime_ns >= Path(results_csv).stat().st_mtime_ns:
+        results = read_columnar(columnar)
+    else:
+        results = read_csv(results_csv)
+    return results.set_index('name').sort_index()
+
+
+@app.function
+def read_columnar(columnar):
+    with load(columnar) as data:
+        results = DataFrame({field: data[field] for field in data['text_fields']}).replace('', nan)
+        exitcodes = DataFrame(data['exitcodes'].astype('int64'), columns=data['exitcode_fields'])
+        return results.join(exitcodes)[list(data['fields'])]
 
 
 @app.cell
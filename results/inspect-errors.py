@@ -3,12 +3,16 @@ from csv import DictReader
 from pathlib import Path
 from random import sample
 from subprocess import run
-from sys import argv
+from sys import argv, path
+from tempfile import NamedTemporaryFile
+path.insert(1, str(Path(__file__).resolve().parent.parent))
+from seekable_archive import SeekableArchive, get_log_member
 
 SAMPLE_SIZE = 5
 EDITOR = 'xdg-open'
 
 def main(error_types_csv, log_dir):
+    archive = SeekableArchive(log_dir) if log_dir.is_file() else None
     rows_by_type = {}
     with error_types_csv.open() as file:
         for row in DictReader(file):
@@ -21,12 +25,16 @@ def main(error_types_csv, log_dir):
         rows = rows_by_type[error_type]
         examples = sample(rows, min(SAMPLE_SIZE, len(rows)))
         for row in examples:
-            dir_name = row['name'].replace('/', '_')
-            log_path = log_dir / dir_name / f"{int(row['jdk']):02d}.fail"
-            run([EDITOR, log_path])
+            member = get_log_member(row['name'], row['jdk'])
+            run([EDITOR, extract_log(archive, member) if archive else log_dir / member])
+
+def extract_log(archive, member):
+    with NamedTemporaryFile(prefix=member.replace('/', '_') + '.', suffix='.fail', delete=False) as log_file:
+        log_file.write(archive.read(member))
+        return log_file.name
 
 if __name__ == '__main__':
     if len(argv) == 3:
         main(Path(argv[1]), Path(argv[2]))
     else:
-        print("Usage: %s <error_types_csv> <log_dir>" % Path(__file__).name)
+        print("Usage: %s <error_types_csv> <log_dir|logs.xza>" % Path(__file__).name)
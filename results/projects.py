@@ -5,6 +5,7 @@ app = marimo.App(width="medium")
 
 with app.setup:
     import marimo as mo
+    from io import StringIO
     from pandas import read_csv
     from marimo import md, output, stop, ui
     from math import isclose
@@ -14,6 +15,8 @@ with app.setup:
     path.insert(1, str(Path(globals()['__file__']).resolve().parent / '..'))
     from common import GITHUB_CSV, MAX_JAVA, RESULTS_CSV, exit_notebook, require_path_args
     from general import get_outcomes, get_results
+    from metadata_store import MetadataStore
+    from seekable_archive import PROJECTS_ARCHIVE
 
 
 @app.cell(hide_code=True)
@@ -155,8 +158,9 @@ def _():
 
 
 @app.cell
-def _(github_csv):
-    github = read_csv(github_csv).set_index('name')
+def _(github_csv, results):
+    with MetadataStore(github_csv) as metadata:
+        github = read_csv(StringIO(metadata.extract(results.index))).set_index('name')
     github.head()
     return (github,)
 
@@ -181,9 +185,15 @@ def _(github, results, subsets, trivial_lines):
 
 @app.cell
 def _(compatible, output_dir, results_dir):
-    projects_tar = 'projects.tar.xz'
-    compatible_dirs = ['projects/' + n.replace('/', '_') for n in compatible.index]
-    extract_command = ['tar', 'xvf', results_dir / projects_tar, '-C', output_dir] + compatible_dirs
+    compatible_units = [n.replace('/', '_') for n in compatible.index]
+    if (results_dir / PROJECTS_ARCHIVE).is_file():
+        projects_tar = PROJECTS_ARCHIVE
+        archive_script = Path(globals()['__file__']).resolve().parent / '..' / 'seekable_archive.py'
+        extract_command = [archive_script, 'extract', results_dir / projects_tar, output_dir] + compatible_units
+    else:
+        projects_tar = 'projects.tar.xz'
+        compatible_dirs = ['projects/' + unit for unit in compatible_units]
+        extract_command = ['tar', 'xvf', results_dir / projects_tar, '-C', output_dir] + compatible_dirs
     extract_button = ui.run_button(label="Extract projects")
     output.append(md(f"To manually inspect these projects, place `{projects_tar}` into the results directory. " +
                      f"After clicking the button, they will be extracted to `{output_dir}`."))
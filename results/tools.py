@@ -16,6 +16,7 @@ with app.setup:
     path.insert(1, str(Path(globals()['__file__']).resolve().parent / '..'))
     from common import MAX_JAVA, MIN_JAVA, RESULTS_CSV, exit_notebook, latex_table, require_path_args
     from general import get_results, get_outcomes
+    from seekable_archive import LOGS_ARCHIVE, get_log_member, open_log_reader
 
 
 @app.cell(hide_code=True)
@@ -30,12 +31,14 @@ def _():
     results_csv = results_dir / RESULTS_CSV
     results_csv.is_file() or exit_notebook(f"File {results_csv} not found")
     log_dir = results_dir / 'logs'
-    log_dir.is_dir() or exit_notebook(f"Directory {log_dir} not found")
+    log_archive = results_dir / LOGS_ARCHIVE
+    log_dir.is_dir() or log_archive.is_file() or exit_notebook(f"Neither {log_dir} nor {log_archive} found")
+    read_log = open_log_reader(results_dir)
     categories_csv = results_dir / 'categories.csv'
     output_dir.mkdir(parents=True, exist_ok=True)
-    md(f"The notebook uses `{results_csv}`, `{log_dir}`, and optionally `{categories_csv}` as input. " +
-       f"For writing, `{output_dir}` is used.")
-    return categories_csv, log_dir, output_dir, results_csv
+    md(f"The notebook uses `{results_csv}`, `{log_dir}` (or `{log_archive}`), and optionally `{categories_csv}` " +
+       f"as input. For writing, `{output_dir}` is used.")
+    return categories_csv, output_dir, read_log, results_csv
 
 
 @app.cell
@@ -202,23 +205,26 @@ def _(results):
 
 @app.cell(hide_code=True)
 def _():
-    mo.md(r"""Next, the log of every failed build is analyzed using build-tool-specific logic (unless an exit code signifies a timeout or a Java Virtual Machine crash). An error type is assigned to each such build.""")
+    mo.md(r"""Next, the log of every failed build is analyzed using build-tool-specific logic (unless an exit code signifies a timeout, a build stopped by the output watchdog after a stall or a fatal message, or a Java Virtual Machine crash). An error type is assigned to each such build.""")
     return
 
 
 @app.function
-def get_failed_types(projects, log_dir):
+def get_failed_types(projects, read_log):
     extractors = {"Gradle": gradle_error, "Maven": maven_error, "Ant": ant_error}
     error_types = []
 
     for project in projects.itertuples():
         if project.status == 124:
             error_type = 'Timeout'
+        elif project.status == 224:
+            error_type = 'Stall'
+        elif project.status == 225:
+            error_type = 'Fatal'
         elif project.status == 134:
             error_type = 'Crash'
         else:
-            file = log_dir / project.name.replace('/', '_') / f'{project.jdk:02d}.fail'
-            log_content = file.read_text()
+            log_content = read_log(get_log_member(project.name, project.jdk))
             error_type = extractors[project.tool](log_content)
         error_types.append(error_type)
 
@@ -283,7 +289,7 @@ def maven_error(log):
 
 @app.cell(hide_code=True)
 def _():
-    mo.md(r"""Ant logs consist of multiple sequentially executed processes. We ignore the first `clean` target process and then find the first process that did not fail because of an invalid target name (e.g., `jar`). If no such process exists, we analyze the last one. In the analyzed log, we return the name of the last executed target, or "Init" if no target was yet executed.""")
+    mo.md(r"""Newer Ant logs consist of one process running `clean` and the target chosen from `build.xml` before the build. Older Ant logs consist of multiple sequentially executed processes. There, we ignore the first `clean` target process and then find the first process that did not fail because of an invalid target name (e.g., `jar`). If no such process exists, we analyze the last one. In the analyzed log, we return the name of the last executed target, or "Init" if no target was yet executed.""")
     return
 
 
@@ -291,8 +297,9 @@ def _():
 def ant_error(log):
     before = r'(?:Picked up .+\n)?Buildfile: /.+\n'
     after = r'\nTotal time: .+ seconds?\n'
-    exclude_clean = 1
-    processes = findall(fr'{before}([\s\S]*?){after}', log)[exclude_clean:]
+    processes = findall(fr'{before}([\s\S]*?){after}', log)
+    exclude_clean = 1 if len(processes) > 1 else 0
+    processes = processes[exclude_clean:]
 
     bad_target = r'BUILD FAILED\nTarget "(jar|war|dist)" does not exist in the project'
     valid_targets = list(p for p in processes if not search(bad_target, p))
@@ -312,8 +319,8 @@ def _():
 
 
 @app.cell
-def _(failed, log_dir, output_dir):
-    failed_types = get_failed_types(failed, log_dir)
+def _(failed, output_dir, read_log):
+    failed_types = get_failed_types(failed, read_log)
     failed_types.to_csv(output_dir / 'error-types.csv', index=False)
     failed_types
     return (failed_types,)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+from argparse import ArgumentParser
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from itertools import islice
+from json import dumps, loads
+from lzma import compress, decompress
+from os import cpu_count, remove
+from os.path import basename, dirname
+from pathlib import Path
+from shutil import copyfileobj
+from struct import calcsize, pack, unpack
+from sys import stdout
+from tarfile import open as open_tar
+from tempfile import mkstemp
+
+ARCHIVE_MAGIC = b'JDKXZA1\n'
+TRAILER = '<Q'
+DEFAULT_PRESET = 6
+LOGS_ARCHIVE = 'logs.xza'
+PROJECTS_ARCHIVE = 'projects.xza'
+
+class SeekableArchive:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        trailer_size = calcsize(TRAILER) + len(ARCHIVE_MAGIC)
+        index_end = self.file.seek(-trailer_size, 2)
+        trailer = self.file.read(trailer_size)
+        if trailer[-len(ARCHIVE_MAGIC):] != ARCHIVE_MAGIC:
+            raise ValueError(f"{path} is not a seekable archive")
+        index_offset, = unpack(TRAILER, trailer[:calcsize(TRAILER)])
+        self.file.seek(index_offset)
+        index = loads(decompress(self.file.read(index_end - index_offset)))
+        self.root = index['root']
+        self.units = {name: (offset, length) for name, offset, length in index['units']}
+
+    def read(self, member):
+        name = f'{self.root}/{member}'
+        with open_tar(fileobj=BytesIO(self.read_unit(member.split('/', 1)[0])), mode='r|xz') as tar:
+            for info in tar:
+                if info.name == name and info.isfile():
+                    return tar.extractfile(info).read()
+        raise KeyError(member)
+
+    def extract(self, units, output_dir):
+        for unit in units:
+            with self.open_unit(unit) as tar:
+                tar.extractall(output_dir, filter='tar')
+
+    def open_unit(self, unit):
+        return open_tar(fileobj=BytesIO(self.read_unit(unit)), mode='r:xz')
+
+    def read_unit(self, unit):
+        offset, length = self.units[unit]
+        self.file.seek(offset)
+        return self.file.read(length)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+def create_archive(source_dir, archive, jobs=None, preset=DEFAULT_PRESET):
+    source_dir = Path(source_dir)
+    units = iter(sorted(entry.name for entry in source_dir.iterdir()))
+    jobs = jobs or cpu_count()
+    index = []
+    with open(archive, 'wb') as out_file, ThreadPoolExecutor(jobs) as executor:
+        pending = deque((unit, executor.submit(compress_unit, source_dir, unit, archive, preset))
+                        for unit in islice(units, 2 * jobs))
+        try:
+            while pending:
+                unit, future = pending.popleft()
+                for next_unit in islice(units, 1):
+                    pending.append((next_unit, executor.submit(compress_unit, source_dir, next_unit, archive, preset)))
+                offset = out_file.tell()
+                append_file(future.result(), out_file)
+                index.append((unit, offset, out_file.tell() - offset))
+        finally:
+            for _, future in pending:
+                if not future.cancel() and future.exception() is None:
+                    remove(future.result())
+
+        index_offset = out_file.tell()
+        out_file.write(compress(dumps({'root': source_dir.name, 'units': index}).encode()))
+        out_file.write(pack(TRAILER, index_offset) + ARCHIVE_MAGIC)
+
+def compress_unit(source_dir, unit, archive, preset):
+    descriptor, temp_path = mkstemp(prefix=basename(archive), dir=dirname(archive) or '.')
+    with open(descriptor, 'wb') as temp_file, open_tar(fileobj=temp_file, mode='w:xz', preset=preset) as tar:
+        tar.add(source_dir / unit, f'{source_dir.name}/{unit}')
+    return temp_path
+
+def append_file(path, out_file):
+    with open(path, 'rb') as in_file:
+        copyfileobj(in_file, out_file)
+    remove(path)
+
+def open_log_reader(results_dir):
+    log_dir = Path(results_dir) / 'logs'
+    if log_dir.is_dir():
+        return lambda member: (log_dir / member).read_text()
+    archive = SeekableArchive(Path(results_dir) / LOGS_ARCHIVE)
+    return lambda member: archive.read(member).decode()
+
+def get_log_member(name, jdk):
+    return f"{name.replace('/', '_')}/{int(jdk):02d}.fail"
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Create or read archives of independently compressed directories")
+    commands = parser.add_subparsers(dest='command', required=True)
+    create_parser = commands.add_parser('create', help="archive each entry of source_dir separately")
+    create_parser.add_argument('archive')
+    create_parser.add_argument('source_dir')
+    create_parser.add_argument('--jobs', type=int, help="parallel compression jobs (default: CPU count)")
+    create_parser.add_argument('--preset', type=int, default=DEFAULT_PRESET, help="xz compression preset")
+    extract_parser = commands.add_parser('extract', help="extract the given entries (default: all)")
+    extract_parser.add_argument('archive')
+    extract_parser.add_argument('output_dir')
+    extract_parser.add_argument('units', nargs='*')
+    cat_parser = commands.add_parser('cat', help="print a file, e.g., owner_repo/17.fail")
+    cat_parser.add_argument('archive')
+    cat_parser.add_argument('member')
+    args = parser.parse_args()
+
+    if args.command == 'create':
+        create_archive(args.source_dir, args.archive, args.jobs, args.preset)
+    else:
+        with SeekableArchive(args.archive) as opened:
+            if args.command == 'extract':
+                opened.extract(args.units or sorted(opened.units), args.output_dir)
+            else:
+                stdout.buffer.write(opened.read(args.member))
@@ -0,0 +1,52 @@
+from os import environ, walk
+from os.path import basename, join
+from pathlib import Path
+from re import fullmatch
+from subprocess import DEVNULL, run
+from sys import path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from unittest import main, TestCase
+path.insert(1, str((Path(__file__).parent / '..' / 'dataset').resolve()))
+cd = __import__('create-dataset')
+
+FILES = int(environ.get('BENCHMARK_FILES', 20000))
+JAVA_SOURCE = ''.join(f'import java.util.List{i};\n' for i in range(20)) + 'class A {\n' + '    int x;\n' * 200 + '}\n'
+
+class TestDatasetBenchmark(TestCase):
+    def test_scanner_is_faster_with_same_verdicts(self):
+        with TemporaryDirectory() as repo:
+            for i in range(FILES):
+                file = Path(repo) / f'module{i % 50}' / 'src' / f'Class{i}.java'
+                file.parent.mkdir(parents=True, exist_ok=True)
+                file.write_text(JAVA_SOURCE)
+            run('git init && git add . && git commit -m test', shell=True, cwd=repo, check=True, stdout=DEVNULL)
+
+            for excluded in (False, True):
+                if excluded:
+                    (Path(repo) / 'module0' / 'src' / 'Class0.java').write_text('import android.View;\n')
+                scans = {'walk': lambda: walk_has_excluded_technology(repo),
+                         'scanner': lambda: cd.project_has_excluded_technology(repo),
+                         'scanner4': lambda: cd.project_has_excluded_technology(repo, jobs=4)}
+                for scan_name, scan in scans.items():
+                    start = perf_counter()
+                    self.assertEqual(scan(), excluded, scan_name)
+                    print(f"{scan_name}, {FILES} files, excluded={excluded}: {perf_counter() - start:.2f} s")
+
+def walk_has_excluded_technology(project_dir):
+    for root, dirs, files in walk(project_dir):
+        for file in files:
+            for name, content in cd.EXCLUDE:
+                if walk_file_matches(join(root, file), name, content):
+                    return True
+    return False
+
+def walk_file_matches(file, name, content):
+    if fullmatch(name, basename(file)):
+        with open(file, encoding='ascii', errors='ignore') as f:
+            if any(fullmatch(content, line.rstrip()) for line in f):
+                return True
+    return False
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+from csv import DictReader
+from os import environ, pathsep
+from pathlib import Path
+from subprocess import run, DEVNULL
+from sys import executable
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from unittest import main, TestCase
+from common import MAX_JAVA, METRICS_CSV, MIN_JAVA, RESULTS_CSV
+
+PROJECTS = int(environ.get('BENCHMARK_PROJECTS', 200))
+BUILD_SECONDS = float(environ.get('FAKE_BUILD_SECONDS', 0))
+SCHEDULES = {'sequential': [], 'jobs4': ['--jobs=4'], 'queue4': ['--jobs=4', '--queue={result_dir}/queue.sqlite']}
+
+class TestExecutionBenchmark(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = TemporaryDirectory()
+        cls.dataset_dir = Path(cls.temp_dir.name) / 'dataset'
+        for i in range(PROJECTS):
+            create_fake_project(cls.dataset_dir / f'owner_repo{i}', i)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.temp_dir.cleanup()
+
+    def test_schedules_produce_same_results(self):
+        builds = PROJECTS * (MAX_JAVA - MIN_JAVA + 1)
+        results = {}
+        for schedule, options in SCHEDULES.items():
+            result_dir = Path(self.temp_dir.name) / schedule
+            seconds = run_benchmark(self.dataset_dir, result_dir, options)
+            jobs = 4 if '--jobs=4' in options else 1
+            overhead = (seconds - builds * BUILD_SECONDS / jobs) / builds
+            print(f"{schedule}: {builds} builds in {seconds:.1f} s, {builds / seconds:.1f} builds/s, "
+                  f"{overhead * 1000:.1f} ms overhead per build")
+
+            with open(result_dir / RESULTS_CSV) as results_file:
+                results[schedule] = sorted(tuple(row.items()) for row in DictReader(results_file))
+            with open(result_dir / METRICS_CSV) as metrics_file:
+                self.assertEqual(len(list(DictReader(metrics_file))), builds)
+            self.assertEqual(len(results[schedule]), PROJECTS)
+
+        for schedule in SCHEDULES:
+            self.assertEqual(results[schedule], results['sequential'], f"{schedule} results differ")
+
+def create_fake_project(project_dir, number):
+    git_dir = project_dir / '.git'
+    (git_dir / 'objects').mkdir(parents=True)
+    (git_dir / 'refs').mkdir()
+    (git_dir / 'HEAD').write_text('%040x\n' % number)
+    (project_dir / 'pom.xml').touch()
+
+def run_benchmark(dataset_dir, result_dir, options):
+    script = (Path(__file__).parent / '..' / 'execution' / 'run-builds.py').resolve()
+    fake_docker = (Path(__file__).parent / 'fake-docker').resolve()
+    env = environ | {'PATH': f'{fake_docker}{pathsep}{environ["PATH"]}',
+                     'FAKE_EXITCODES': environ.get('FAKE_EXITCODES', '0 0 0 1 124')}
+    options = [option.format(result_dir=result_dir) for option in options]
+    start = perf_counter()
+    run([executable, script, '--docker-cli', *options, dataset_dir, result_dir, result_dir / 'logs'],
+        env=env, stderr=DEVNULL, check=True)
+    return perf_counter() - start
+
+if __name__ == '__main__':
+    main()
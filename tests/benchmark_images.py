@@ -0,0 +1,47 @@
+from os import environ
+from pathlib import Path
+from shutil import which
+from subprocess import DEVNULL, run
+from sys import path
+from unittest import main, skipUnless, TestCase
+path.insert(1, str((Path(__file__).parent / '..' / 'environment').resolve()))
+bi = __import__('build-images')
+
+REPETITIONS = int(environ.get('BENCHMARK_REPETITIONS', 5))
+TOOL_COMMANDS = {'gradle': 'GRADLE_USER_HOME=/tmp/home gradle --no-daemon --offline --version',
+                 'mvn': 'mvn --version', 'ant': 'ant -version'}
+STARTUP_SCRIPT = '''
+for tool in %s; do
+  archive=/opt/cds/$tool.jsa
+  [ -f "$archive" ] || continue
+  for mode in off on; do
+    options=""
+    [ $mode = on ] && options="-XX:SharedArchiveFile=$archive -Xlog:cds*=off"
+    start=$(date +%%s%%N)
+    for i in $(seq %d); do
+      GRADLE_OPTS=$options MAVEN_OPTS=$options ANT_OPTS=$options eval "${commands[$tool]}" >/dev/null 2>&1
+    done
+    echo "$tool $mode $(( ($(date +%%s%%N) - start) / %d / 1000000 ))"
+  done
+done
+'''
+
+@skipUnless(which('docker'), "Docker is not available")
+class TestImagesBenchmark(TestCase):
+    def test_tool_startup_with_class_data_sharing(self):
+        commands = 'declare -A commands=(%s)' % ' '.join(f'[{tool}]="{command}"' for tool, command in TOOL_COMMANDS.items())
+        script = commands + STARTUP_SCRIPT % (' '.join(TOOL_COMMANDS), REPETITIONS, REPETITIONS)
+        for java_version in range(bi.MIN_JAVA, bi.MAX_JAVA + 1):
+            image = f'{bi.IMAGE_NAME}:{java_version}'
+            if run(['docker', 'image', 'inspect', image], stdout=DEVNULL, stderr=DEVNULL).returncode != 0:
+                continue
+            output = run(['docker', 'run', '--rm', '--entrypoint=bash', image, '-c', script],
+                         capture_output=True, check=True).stdout.decode()
+            times = {(tool, mode): int(ms) for tool, mode, ms in (line.split() for line in output.splitlines())}
+            for tool in TOOL_COMMANDS:
+                if (tool, 'on') in times:
+                    off, on = times[tool, 'off'], times[tool, 'on']
+                    print(f"Java {java_version}, {tool}: {off} ms without CDS, {on} ms with CDS ({on / off:.2f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -1,25 +1,38 @@
+from json import loads
 from pathlib import Path
-from subprocess import DEVNULL, run
+from subprocess import DEVNULL, check_output, run
 from sys import executable
 from unittest import main, TestCase
-from common import DOCKER_PROJECT_SRC, IMAGE_NAME, MIN_JAVA, MAX_JAVA, TOOLS
+from common import DOCKER_PROJECT_SRC, MIN_JAVA, MAX_JAVA, TOOLS, get_image
 
 class TestEnvironment(TestCase):
     @classmethod
     def setUpClass(cls):
         build_images = (Path(__file__).parent / '..' / 'environment' / 'build-images.py').resolve()
         run([executable, build_images], stdout=DEVNULL, stderr=DEVNULL, check=True)
+        run([executable, build_images, '--slim'], stdout=DEVNULL, stderr=DEVNULL, check=True)
 
     def test_tools_pass_for_each_java_version(self):
         for tool in TOOLS:
             build_dir = Path(__file__).parent / 'pass-all' / f'{tool.command}_project'
             for java_version in range(MIN_JAVA, MAX_JAVA + 1):
-                with self.subTest(tool=tool.name, java_version=java_version):
-                    command = ['docker', 'run', '--rm',
-                               f'--mount=type=bind,src={build_dir},dst={DOCKER_PROJECT_SRC},readonly',
-                               f'{IMAGE_NAME}:{java_version}', tool.command]
-                    result = run(command, stdout=DEVNULL, stderr=DEVNULL)
-                    self.assertEqual(result.returncode, 0, f"Java {java_version} {tool.name} failed")
+                for slim in (False, True):
+                    with self.subTest(tool=tool.name, java_version=java_version, slim=slim):
+                        command = ['docker', 'run', '--rm',
+                                   f'--mount=type=bind,src={build_dir},dst={DOCKER_PROJECT_SRC},readonly',
+                                   get_image(java_version, slim), tool.command]
+                        result = run(command, stdout=DEVNULL, stderr=DEVNULL)
+                        self.assertEqual(result.returncode, 0, f"{get_image(java_version, slim)} {tool.name} failed")
+
+    def test_images_share_build_tool_layers(self):
+        base, java17, java21 = (self.get_layers(image) for image in ('ubuntu:24.04', get_image(17), get_image(21)))
+        tool_layers = len(base) + 4
+        self.assertEqual(java17[:tool_layers], java21[:tool_layers])
+        self.assertNotEqual(java17[tool_layers], java21[tool_layers])
+
+    @staticmethod
+    def get_layers(image):
+        return loads(check_output(['docker', 'image', 'inspect', '--format', '{{json .RootFS.Layers}}', image]))
 
 if __name__ == '__main__':
     main()
@@ -1,6 +1,16 @@
+from functools import partial
+from io import BytesIO
+from json import dumps
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from os import environ, pathsep
 from pathlib import Path
+from subprocess import CompletedProcess
 from sys import path
+from tarfile import open as open_tar, TarInfo
+from tempfile import TemporaryDirectory
+from threading import Thread
 from unittest import main, TestCase
+from unittest.mock import patch
 path.insert(1, str((Path(__file__).parent / '..' / 'environment').resolve()))
 bi = __import__('build-images')
 
@@ -22,5 +32,163 @@ class TestBuildImages(TestCase):
                 else:
                     self.assertEqual(bc_version, '')
 
+    def test_shared_artifacts_are_listed_once_per_version(self):
+        urls = [bi.get_artifact_urls(java_version) for java_version in range(bi.MIN_JAVA, bi.MAX_JAVA + 1)]
+        names = [bi.get_artifact_name(url) for url in urls[11 - bi.MIN_JAVA]]
+        self.assertEqual(names, ['gradle-8.13-bin.zip', 'apache-maven-3.9.9-bin.tar.gz', 'apache-ant-1.10.15-bin.tar.gz',
+                                 'apache-ivy-2.5.3-bin.tar.gz', 'zulu11.78.15-ca-jdk11.0.26-linux_x64.tar.gz'])
+        self.assertEqual(len(urls[0]), 8)
+        self.assertEqual(len({url for version_urls in urls for url in version_urls}), 18 + 3 + 3 + 2 + 3 + 3)
+
+    def test_artifacts_are_fetched_once_and_verified(self):
+        with TemporaryDirectory() as temp_dir, self.serve_artifacts(temp_dir) as (mirror, requests):
+            cache_dir = Path(temp_dir) / 'cache'
+            checksums = Path(temp_dir) / 'checksums.txt'
+            urls = ['https://example.com/a/one.zip', 'https://example.com/b/two.tar.gz']
+            bi.fetch_artifacts(urls, cache_dir, 2, mirror, checksums, pin=True)
+            bi.fetch_artifacts(urls, cache_dir, 2, mirror, checksums)
+            self.assertEqual(sorted(requests), ['/one.zip', '/two.tar.gz'])
+            self.assertEqual((cache_dir / 'one.zip').read_bytes(), b'one.zip')
+            self.assertEqual(len(checksums.read_text().splitlines()), 2)
+
+            (cache_dir / 'one.zip').write_bytes(b'corrupted')
+            bi.fetch_artifacts(urls, cache_dir, 2, mirror, checksums)
+            self.assertEqual((cache_dir / 'one.zip').read_bytes(), b'one.zip')
+
+            (Path(temp_dir) / 'served' / 'two.tar.gz').write_bytes(b'tampered')
+            (cache_dir / 'two.tar.gz').unlink()
+            self.assertRaises(ValueError, bi.fetch_artifacts, urls, cache_dir, 2, mirror, checksums)
+            self.assertEqual([file.name for file in cache_dir.iterdir()], ['one.zip'])
+
+    def test_artifacts_without_pinned_checksums_are_trusted_on_first_use(self):
+        with TemporaryDirectory() as temp_dir, self.serve_artifacts(temp_dir) as (mirror, requests):
+            cache_dir = Path(temp_dir) / 'cache'
+            checksums = Path(temp_dir) / 'checksums.txt'
+            checksums.write_text(f"{bi.get_file_hash(Path(temp_dir) / 'served' / 'one.zip')}  one.zip\n")
+            urls = ['https://example.com/a/one.zip', 'https://example.com/b/two.tar.gz']
+            with self.assertLogs(level='WARNING') as logs:
+                bi.fetch_artifacts(urls, cache_dir, 2, mirror, checksums)
+            self.assertIn('two.tar.gz', logs.output[0])
+            self.assertNotIn('one.zip', logs.output[0])
+            self.assertEqual(bi.read_checksums(cache_dir / bi.TRUSTED_CHECKSUMS),
+                             {'two.tar.gz': bi.get_file_hash(cache_dir / 'two.tar.gz')})
+            self.assertEqual(len(checksums.read_text().splitlines()), 1)
+
+            (Path(temp_dir) / 'served' / 'two.tar.gz').write_bytes(b'tampered')
+            (cache_dir / 'two.tar.gz').unlink()
+            self.assertRaises(ValueError, bi.fetch_artifacts, urls, cache_dir, 2, mirror, checksums)
+
+    def test_committed_checksums_cover_every_artifact(self):
+        urls = {url for java_version in range(bi.MIN_JAVA, bi.MAX_JAVA + 1)
+                for url in bi.get_artifact_urls(java_version)}
+        names = set(map(bi.get_artifact_name, urls))
+        if bi.CHECKSUMS_FILE.is_file():
+            self.assertEqual(names - set(bi.read_checksums(bi.CHECKSUMS_FILE)), set())
+        else:
+            with TemporaryDirectory() as temp_dir, patch.object(bi, 'fetch_artifact', return_value='0' * 64), \
+                    self.assertLogs(level='WARNING') as logs:
+                bi.fetch_artifacts(sorted(urls), temp_dir)
+            self.assertTrue(all(name in logs.output[0] for name in names))
+
+    def test_images_are_built_from_cached_artifacts(self):
+        fake_docker = Path(__file__).parent / 'fake-docker'
+        with (TemporaryDirectory() as temp_dir, self.serve_artifacts(temp_dir) as (mirror, requests),
+              patch.dict(environ, {'PATH': f"{fake_docker}{pathsep}{environ['PATH']}"}),
+              patch.object(bi, 'get_build_command', wraps=bi.get_build_command) as get_build_command):
+            bi.pin_checksums(4, Path(temp_dir) / 'cache', mirror, Path(temp_dir) / 'checksums.txt')
+            bi.build_all_images(4, Path(temp_dir) / 'cache', mirror, Path(temp_dir) / 'checksums.txt')
+            commands = [call.args for call in get_build_command.call_args_list]
+            self.assertEqual(sorted(java_version for java_version, _, _ in commands),
+                             list(range(bi.MIN_JAVA, bi.MAX_JAVA + 1)))
+            self.assertEqual(len(requests), len(set(requests)))
+            self.assertEqual([file.name for file in (Path(temp_dir) / 'cache').iterdir() if file.is_dir()], [])
+
+    def test_build_arguments_follow_inputs(self):
+        command = bi.get_build_command(6, '/artifacts', bi.get_image_inputs(6))
+        build_args = [command[i + 1] for i, arg in enumerate(command) if arg == '--build-arg']
+        self.assertIn('BOUNCY_CASTLE=1.73', build_args)
+        self.assertIn('USE_CDS=0', build_args)
+        self.assertFalse(any(arg.startswith(('DOCKERFILE', 'RUN-BUILD')) for arg in build_args))
+
+    def test_images_with_matching_fingerprints_are_skipped(self):
+        inputs = {java_version: bi.get_image_inputs(java_version) for java_version in (8, 11, 17, 21)}
+        manifest = {'17': inputs[17] | {'Maven': '3.9.8'}, '21': inputs[21]}
+        fingerprints = {f'{bi.IMAGE_NAME}:8': None, f'{bi.IMAGE_NAME}:11': bi.get_fingerprint(inputs[11]),
+                        f'{bi.IMAGE_NAME}:17': bi.get_fingerprint(manifest['17']), f'{bi.IMAGE_NAME}:21': 'other'}
+        with patch.object(bi, 'get_image_fingerprint', side_effect=fingerprints.get):
+            self.assertEqual(bi.get_stale_images(inputs, manifest),
+                             {8: "built, no image found", 17: "rebuilt, changed: Maven",
+                              21: "rebuilt, changed: unknown inputs"})
+            self.assertEqual(set(bi.get_stale_images(inputs, manifest, force=True)), {8, 11, 17, 21})
+
+    def test_fingerprint_covers_context_files(self):
+        inputs = bi.get_image_inputs(11)
+        self.assertEqual(set(inputs), set(bi.VERSIONS) | {'Use_CDS', 'Slim', 'Dockerfile', 'run-build.sh'})
+        self.assertNotEqual(bi.get_fingerprint(inputs), bi.get_fingerprint(bi.get_image_inputs(11, cds=True)))
+        self.assertNotEqual(bi.get_fingerprint(inputs), bi.get_fingerprint(bi.get_image_inputs(11, slim=True)))
+        self.assertNotEqual(bi.get_fingerprint(inputs), bi.get_fingerprint(inputs | {'Dockerfile': ''}))
+
+    def test_slim_images_are_tagged_and_tracked_separately(self):
+        inputs = {11: bi.get_image_inputs(11, slim=True)}
+        command = bi.get_build_command(11, '/artifacts', inputs[11])
+        self.assertIn('SLIM=1', command)
+        self.assertEqual(command[-2], f'{bi.IMAGE_NAME}:11-slim')
+
+        manifest = {'11': bi.get_image_inputs(11), '11-slim': inputs[11]}
+        fingerprints = {f'{bi.IMAGE_NAME}:11': 'other', f'{bi.IMAGE_NAME}:11-slim': bi.get_fingerprint(inputs[11])}
+        with patch.object(bi, 'get_image_fingerprint', side_effect=fingerprints.get):
+            self.assertEqual(bi.get_stale_images(inputs, manifest), {})
+
+    def test_exported_bundle_stores_shared_layers_once(self):
+        def save(command, **_):
+            bundle = command[command.index('--output') + 1]
+            tags = [image.split(':')[1] for image in command[4:]]
+            manifest = dumps([{'Layers': ['blobs/sha256/base', f'blobs/sha256/{tag}']} for tag in tags]).encode()
+            with open_tar(bundle, 'w') as tar:
+                info = TarInfo('manifest.json')
+                info.size = len(manifest)
+                tar.addfile(info, BytesIO(manifest))
+            return CompletedProcess(command, 0)
+
+        with TemporaryDirectory() as temp_dir, patch.object(bi, 'run', side_effect=save) as run:
+            bundle = Path(temp_dir) / 'images.tar'
+            bi.export_images(bundle, slim=True)
+            self.assertEqual(run.call_args.args[0][4:],
+                             [f'{bi.IMAGE_NAME}:{v}-slim' for v in range(bi.MIN_JAVA, bi.MAX_JAVA + 1)])
+            images = bi.MAX_JAVA - bi.MIN_JAVA + 1
+            self.assertEqual(bi.count_bundle_layers(bundle), (2 * images, images + 1))
+
+    @staticmethod
+    def serve_artifacts(temp_dir):
+        served = Path(temp_dir) / 'served'
+        served.mkdir()
+        for java_version in range(bi.MIN_JAVA, bi.MAX_JAVA + 1):
+            for url in bi.get_artifact_urls(java_version):
+                (served / bi.get_artifact_name(url)).write_text(bi.get_artifact_name(url))
+        for name in ('one.zip', 'two.tar.gz'):
+            (served / name).write_text(name)
+        return ArtifactServer(served)
+
+class ArtifactServer:
+    def __init__(self, directory):
+        self.requests = []
+        requests = self.requests
+        class Handler(SimpleHTTPRequestHandler):
+            def do_GET(self):
+                requests.append(self.path)
+                super().do_GET()
+
+            def log_message(self, *_):
+                pass
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), partial(Handler, directory=str(directory)))
+
+    def __enter__(self):
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        return f'http://127.0.0.1:{self.server.server_port}', self.requests
+
+    def __exit__(self, *_):
+        self.server.shutdown()
+        self.server.server_close()
+
 if __name__ == '__main__':
     main()
@@ -5,8 +5,10 @@ from subprocess import DEVNULL, run
 from sys import path
 from tempfile import TemporaryDirectory
 from unittest import main, TestCase
+from unittest.mock import patch
 path.insert(1, str((Path(__file__).parent / '..' / 'dataset').resolve()))
 cd = __import__('create-dataset')
+from manifest import Manifest
 
 class TestCreateDataset(TestCase):
     @classmethod
@@ -86,16 +88,20 @@ class TestCreateDataset(TestCase):
         hashes = set()
         project = Path(__file__).parent / 'duplicate' / 'project_1'
         with self.create_git_repo(project) as repo, self.create_git_repo(project) as duplicate:
-            self.assertFalse(cd.project_is_duplicate(repo, hashes))
-            self.assertTrue(cd.project_is_duplicate(duplicate, hashes))
+            self.assertIsNone(cd.get_rejection_reason(self.get_candidate(repo), hashes))
+            self.assertEqual(cd.get_rejection_reason(self.get_candidate(duplicate), hashes), 'duplicate')
 
     def test_distinct_projects_are_undetected(self):
         hashes = set()
         project1 = Path(__file__).parent / 'duplicate' / 'project_1'
         project2 = Path(__file__).parent / 'duplicate' / 'project_2'
         with self.create_git_repo(project1) as repo, self.create_git_repo(project2) as distinct:
-            self.assertFalse(cd.project_is_duplicate(repo, hashes))
-            self.assertFalse(cd.project_is_duplicate(distinct, hashes))
+            self.assertIsNone(cd.get_rejection_reason(self.get_candidate(repo), hashes))
+            self.assertIsNone(cd.get_rejection_reason(self.get_candidate(distinct), hashes))
+
+    @staticmethod
+    def get_candidate(repo):
+        return cd.Candidate(True, True, cd.get_project_hash(repo), False)
 
     @staticmethod
     def create_git_repo(project):
@@ -104,6 +110,72 @@ class TestCreateDataset(TestCase):
         run('git init && git add . && git commit -m test', shell=True, cwd=repo.name, check=True, stdout=DEVNULL)
         return repo
 
+    def test_parallel_probing_and_cloning_select_same_projects(self):
+        with TemporaryDirectory() as temp_dir:
+            github_csv = self.create_remote_projects(temp_dir)
+            selected = []
+            cloned = []
+            clone_repo = cd.clone_repo
+            with (patch.object(cd, 'GIT_URL', f"file://{Path(temp_dir) / 'remote'}/%s.git"),
+                  patch.object(cd, 'clone_repo', side_effect=lambda p, o: cloned.append(p['name']) or clone_repo(p, o))):
+                for jobs, probe in ((1, False), (4, False), (4, True)):
+                    cloned.clear()
+                    output_dir = Path(temp_dir) / f'output{jobs}{probe}'
+                    cd.create_dataset(github_csv, output_dir, 5, jobs, probe)
+                    selected.append(sorted(file.name for file in output_dir.iterdir() if file.is_dir()))
+
+        self.assertEqual(len(selected[0]), 5)
+        self.assertEqual(selected[0], selected[1])
+        self.assertEqual(selected[0], selected[2])
+        self.assertFalse({'owner_no-tool', 'owner_android', 'owner_android-copy', 'owner_gone'} & set(selected[0]))
+        self.assertFalse({'owner/no-tool', 'owner/android', 'owner/android-copy'} & set(cloned))
+
+    def test_extended_dataset_equals_new_dataset(self):
+        with TemporaryDirectory() as temp_name:
+            temp_dir = Path(temp_name)
+            github_csv = self.create_remote_projects(temp_dir)
+            cloned = []
+            clone_repo = cd.clone_repo
+            with (patch.object(cd, 'GIT_URL', f"file://{Path(temp_dir) / 'remote'}/%s.git"),
+                  patch.object(cd, 'clone_repo', side_effect=lambda p, o: cloned.append(p['name']) or clone_repo(p, o))):
+                cd.create_dataset(github_csv, Path(temp_dir) / 'new', 7, probe=False)
+                extended_dir = Path(temp_dir) / 'extended'
+                cd.create_dataset(github_csv, extended_dir, 3, probe=False)
+                decided = Manifest(extended_dir / cd.MANIFEST_FILE).decided()
+                undecided = next(f'owner_tool{i}' for i in range(8) if f'owner/tool{i}' not in decided)
+                (extended_dir / undecided / 'partial').mkdir(parents=True)
+                cloned.clear()
+                cd.create_dataset(github_csv, extended_dir, 7, probe=False)
+
+            new = sorted(str(file.relative_to(temp_dir / 'new')) for file in (temp_dir / 'new').glob('*/*'))
+            extended = sorted(str(file.relative_to(extended_dir)) for file in extended_dir.glob('*/*'))
+        self.assertEqual(new, extended)
+        projects = {file.split('/')[0].replace('_', '/', 1) for file in new}
+        self.assertEqual(len(projects), 7)
+        self.assertEqual(len(set(cloned) & projects), 4)
+
+    def create_remote_projects(self, temp_dir):
+        projects = {f'owner/tool{i}': {'pom.xml': '', 'file.txt': str(i)} for i in range(8)}
+        projects |= {'owner/duplicate': {'pom.xml': '', 'file.txt': '0'},
+                     'owner/no-tool': {'file.txt': ''},
+                     'owner/android': {'pom.xml': '', 'AndroidManifest.xml': '<manifest/>'},
+                     'owner/android-copy': {'pom.xml': '', 'AndroidManifest.xml': '<manifest/>'}}
+        for name, files in projects.items():
+            self.create_bare_repo(Path(temp_dir) / 'remote' / f'{name}.git', files)
+        github_csv = Path(temp_dir) / 'github.csv'
+        github_csv.write_text('name,license\n' + ''.join(f'{name},MIT\n' for name in [*projects, 'owner/gone']))
+        return github_csv
+
+    @staticmethod
+    def create_bare_repo(repo_dir, files):
+        with TemporaryDirectory() as work_dir:
+            for file, content in files.items():
+                (Path(work_dir) / file).write_text(content)
+            run('git init && git add . && git commit -m test', shell=True, cwd=work_dir, check=True, stdout=DEVNULL)
+            run(['git', 'clone', '--bare', work_dir, repo_dir], check=True, stdout=DEVNULL, stderr=DEVNULL)
+        for option in ('uploadpack.allowFilter', 'uploadpack.allowAnySHA1InWant'):
+            run(['git', 'config', option, 'true'], cwd=repo_dir, check=True)
+
     def test_excluded_technologies_are_excluded(self):
         projects = Path(__file__).parent / 'exclude'
         for project in projects.iterdir():
@@ -116,24 +188,5 @@ class TestCreateDataset(TestCase):
             self.assertFalse(cd.project_has_excluded_technology(project),
                              f"Inclusion failed for {project.name}")
 
-    def test_file_matches_present_patterns(self):
-        file = Path(__file__).parent / 'match' / 'match.txt'
-        patterns = [[r'match\.txt', r'start middle end'],
-                    [r'.*\.txt', r'start middle .*'],
-                    [r'match\..*', r'.* middle end'],]
-        for name, content in patterns:
-            self.assertTrue(cd.file_matches(file, name, content),
-                            f"File {name} does not contain {content}")
-
-    def test_file_does_not_match_absent_patterns(self):
-        file = Path(__file__).parent / 'match' / 'match.txt'
-        patterns = [[r'match', r'start middle end'],
-                    [r'txt', r'start middle end'],
-                    [r'.*', r'start middle'],
-                    [r'.*', r'middle end']]
-        for name, content in patterns:
-            self.assertFalse(cd.file_matches(file, name, content),
-                             f"File {name} contains {content}")
-
 if __name__ == '__main__':
     main()
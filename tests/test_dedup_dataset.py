@@ -0,0 +1,69 @@
+from os import chmod, stat, symlink
+from pathlib import Path
+from subprocess import DEVNULL, check_output, run
+from sys import path
+from tempfile import TemporaryDirectory
+from unittest import main, TestCase
+path.insert(1, str((Path(__file__).parent / '..' / 'dataset').resolve()))
+dd = __import__('dedup-dataset')
+
+class TestDedupDataset(TestCase):
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.dataset_dir = Path(self.temp_dir.name) / 'projects'
+        self.store_dir = Path(self.temp_dir.name) / 'store'
+        for project in ('owner_a', 'owner_b', 'owner_c'):
+            project_dir = self.dataset_dir / project
+            (project_dir / 'lib').mkdir(parents=True)
+            (project_dir / 'lib' / 'shared.jar').write_bytes(b'jar' * 1000)
+            (project_dir / 'gradlew').write_text('#!/bin/sh\n')
+            (project_dir / 'Main.java').write_text(f'class {project} {{}}\n')
+            symlink('lib/shared.jar', project_dir / 'link.jar')
+            run('git init && git add . && git commit -m test', shell=True, cwd=project_dir, check=True,
+                stdout=DEVNULL)
+        chmod(self.dataset_dir / 'owner_c' / 'gradlew', 0o755)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def inode(self, project, file):
+        return stat(self.dataset_dir / project / file).st_ino
+
+    def test_identical_files_are_hard_linked(self):
+        commits = [self.get_commit(project) for project in ('owner_a', 'owner_b')]
+        dd.dedup_dataset(self.dataset_dir, self.store_dir)
+
+        self.assertEqual(len({self.inode(p, 'lib/shared.jar') for p in ('owner_a', 'owner_b', 'owner_c')}), 1)
+        self.assertEqual(self.inode('owner_a', 'gradlew'), self.inode('owner_b', 'gradlew'))
+        self.assertNotEqual(self.inode('owner_a', 'gradlew'), self.inode('owner_c', 'gradlew'))
+        self.assertNotEqual(self.inode('owner_a', 'Main.java'), self.inode('owner_b', 'Main.java'))
+        self.assertTrue((self.dataset_dir / 'owner_c' / 'link.jar').is_symlink())
+        self.assertEqual((self.dataset_dir / 'owner_b' / 'lib' / 'shared.jar').read_bytes(), b'jar' * 1000)
+        self.assertEqual(stat(self.dataset_dir / 'owner_c' / 'gradlew').st_mode & 0o777, 0o755)
+        self.assertEqual([self.get_commit(project) for project in ('owner_a', 'owner_b')], commits)
+        self.assertEqual(dd.get_store_savings(self.store_dir), 2 * 3000 + 10)
+
+    def test_repeated_run_keeps_links(self):
+        dd.dedup_dataset(self.dataset_dir, self.store_dir)
+        inode = self.inode('owner_a', 'lib/shared.jar')
+        dd.dedup_dataset(self.dataset_dir, self.store_dir)
+        self.assertEqual(self.inode('owner_c', 'lib/shared.jar'), inode)
+        self.assertEqual(dd.get_store_savings(self.store_dir), 2 * 3000 + 10)
+
+    def test_neighbouring_files_are_kept(self):
+        neighbour = self.dataset_dir / 'owner_b' / 'lib' / 'shared.jar.dedup'
+        neighbour.write_text('keep')
+        dd.dedup_dataset(self.dataset_dir, self.store_dir)
+        self.assertEqual(neighbour.read_text(), 'keep')
+        self.assertEqual(sorted(p.name for p in neighbour.parent.iterdir()), ['shared.jar', 'shared.jar.dedup'])
+
+    def test_git_metadata_is_not_linked(self):
+        dd.dedup_dataset(self.dataset_dir, self.store_dir)
+        git_files = [file for file in (self.dataset_dir / 'owner_a' / '.git').rglob('*') if file.is_file()]
+        self.assertTrue(all(file.stat().st_nlink == 1 for file in git_files))
+
+    def get_commit(self, project):
+        return check_output(['git', 'rev-parse', 'HEAD'], cwd=self.dataset_dir / project).decode()
+
+if __name__ == '__main__':
+    main()
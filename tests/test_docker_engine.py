@@ -0,0 +1,132 @@
+from http.server import BaseHTTPRequestHandler
+from io import BytesIO
+from json import dumps, loads
+from pathlib import Path
+from socketserver import ThreadingUnixStreamServer
+from struct import pack
+from sys import path
+from tempfile import TemporaryDirectory
+from threading import Thread
+from urllib.parse import urlencode
+from unittest import main, TestCase
+path.insert(1, str((Path(__file__).parent / '..' / 'execution').resolve()))
+from docker_engine import Engine, EngineError
+
+class FakeEngineHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.respond()
+
+    def do_POST(self):
+        self.respond()
+
+    def do_DELETE(self):
+        self.respond()
+
+    def respond(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = loads(self.rfile.read(length)) if length else None
+        self.server.requests.append((self.command, self.path, body))
+        status, content = self.server.responses.get((self.command, self.path.split('?')[0]), (204, b''))
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *_):
+        pass
+
+class FakeEngine(ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, responses):
+        super().__init__(socket_path, FakeEngineHandler)
+        self.responses = responses
+        self.requests = []
+        self.connections = 0
+
+def log_frame(stream, text):
+    return pack('>BxxxL', stream, len(text)) + text
+
+class TestDockerEngine(TestCase):
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.socket_path = str(Path(self.temp_dir.name) / 'docker.sock')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def start_server(self, responses):
+        server = FakeEngine(self.socket_path, responses)
+        Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_run_container_streams_logs_and_returns_status(self):
+        logs = log_frame(1, b'stdout line\n') + log_frame(2, b'stderr line\n') + log_frame(1, b'')
+        server = self.start_server({
+            ('POST', '/v1.41/containers/create'): (201, dumps({'Id': 'abc'}).encode()),
+            ('GET', '/v1.41/containers/abc/logs'): (200, logs),
+            ('POST', '/v1.41/containers/abc/wait'): (200, dumps({'StatusCode': 3}).encode())})
+        output = BytesIO()
+        mounts = [{'Type': 'volume', 'Source': 'cache', 'Target': '/cache'}]
+
+        status = Engine(self.socket_path).run_container('name', 'image:6', ['mvn'], mounts, output)
+
+        self.assertEqual(status, 3)
+        self.assertEqual(output.getvalue(), b'stdout line\nstderr line\n')
+        methods_paths = [(method, path.split('?')[0]) for method, path, _ in server.requests]
+        self.assertEqual(methods_paths, [('POST', '/v1.41/containers/create'),
+                                         ('POST', '/v1.41/containers/abc/start'),
+                                         ('GET', '/v1.41/containers/abc/logs'),
+                                         ('POST', '/v1.41/containers/abc/wait'),
+                                         ('DELETE', '/v1.41/containers/abc')])
+        config = server.requests[0][2]
+        self.assertEqual(config['Image'], 'image:6')
+        self.assertEqual(config['Cmd'], ['mvn'])
+        self.assertEqual(config['HostConfig']['Mounts'], mounts)
+        self.assertEqual(server.connections, 1)
+
+    def test_missing_volume_is_reported(self):
+        self.start_server({('GET', '/v1.41/volumes/absent'): (404, b'{"message": "no such volume"}')})
+        engine = Engine(self.socket_path)
+        self.assertFalse(engine.volume_exists('absent'))
+        self.assertTrue(engine.volume_exists('present'))
+
+    def test_removing_missing_volume_is_optional_error(self):
+        self.start_server({('DELETE', '/v1.41/volumes/absent'): (404, b'{"message": "no such volume"}')})
+        engine = Engine(self.socket_path)
+        engine.remove_volume('absent', missing_ok=True)
+        with self.assertRaises(EngineError):
+            engine.remove_volume('absent')
+
+    def test_image_id_is_none_for_missing_image(self):
+        self.start_server({('GET', '/v1.41/images/image:6/json'): (200, b'{"Id": "sha256:abc"}'),
+                           ('GET', '/v1.41/images/image:7/json'): (404, b'{"message": "no such image"}')})
+        engine = Engine(self.socket_path)
+        self.assertEqual(engine.image_id('image:6'), 'sha256:abc')
+        self.assertIsNone(engine.image_id('image:7'))
+
+    def test_containers_and_volumes_are_listed_by_name(self):
+        server = self.start_server({
+            ('GET', '/v1.41/containers/json'): (200, dumps([{'Names': ['/a_w1']}, {'Names': ['/b_w1']}]).encode()),
+            ('GET', '/v1.41/volumes'): (200, dumps({'Volumes': None}).encode())})
+        engine = Engine(self.socket_path)
+        self.assertEqual(engine.list_containers('w1'), ['a_w1', 'b_w1'])
+        self.assertEqual(engine.list_volumes('w1'), [])
+        self.assertIn('all=1', server.requests[0][1])
+        self.assertIn(urlencode({'filters': dumps({'name': ['w1']})}), server.requests[1][1])
+
+    def test_stopping_stopped_container_is_ignored(self):
+        server = self.start_server({('POST', '/v1.41/containers/done/stop'): (304, b'')})
+        Engine(self.socket_path).stop_container('done', timeout=1)
+        self.assertEqual(server.requests, [('POST', '/v1.41/containers/done/stop?t=1', None)])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+from errno import EXDEV
+from os import rename
+from pathlib import Path
+from sys import path
+from tempfile import TemporaryDirectory
+from unittest import main, TestCase
+from unittest.mock import patch
+from numpy import load, uint8
+path.insert(1, str((Path(__file__).parent / '..' / 'execution').resolve()))
+jr = __import__('join-results')
+
+HEADER = 'name,commit,tool,wrapper,java6,java7\n'
+
+class TestJoinResults(TestCase):
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.target = self.root / 'joined'
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def create_source(self, name, rows, metrics=None, header=HEADER):
+        source = self.root / name
+        source.mkdir()
+        (source / 'results.csv').write_text(header + ''.join(rows))
+        if metrics is not None:
+            (source / 'metrics.csv').write_text('name,jdk,wall_seconds\n' + ''.join(metrics))
+        for row in rows:
+            log_dir = source / row.split(',')[0].replace('/', '_')
+            log_dir.mkdir(exist_ok=True)
+            (log_dir / '06.fail').write_text(name)
+        return source
+
+    def test_sources_are_merged_without_duplicates(self):
+        first = self.create_source('a', ['o/a,c1,Maven,,0,1\n', 'o/b,c2,Ant,,124,0\n'], ['o/a,6,1.5\n'])
+        second = self.create_source('b', ['o/c,c3,Gradle,gradlew,0,0\n', 'o/a,c1,Maven,,0,1\n'],
+                                    ['o/c,6,2\n', 'o/a,6,1.5\n'])
+        (second / 'journal.csv').write_text('name,jdk,exitcode\no/c,6,0\n')
+        conflicts = jr.join_results([first, second], self.target)
+
+        self.assertEqual((self.target / 'results.csv').read_text(),
+                         HEADER + 'o/a,c1,Maven,,0,1\no/b,c2,Ant,,124,0\no/c,c3,Gradle,gradlew,0,0\n')
+        self.assertEqual((self.target / 'metrics.csv').read_text(), 'name,jdk,wall_seconds\no/a,6,1.5\no/c,6,2\n')
+        self.assertEqual(conflicts, [f"Log directory {second / 'o_a'} left in place, {self.target / 'o_a'} exists"])
+        self.assertEqual((self.target / 'o_c' / '06.fail').read_text(), 'b')
+        self.assertFalse(first.exists())
+        self.assertEqual([file.name for file in second.iterdir()], ['o_a'])
+
+    def test_conflicting_and_invalid_rows_are_reported(self):
+        first = self.create_source('a', ['o/a,c1,Maven,,0,1\n'])
+        second = self.create_source('b', ['o/a,c1,Maven,,1,1\n', 'o/b,c2,Ant,,x,0\n', 'o/c,c3,Ant,,0\n'])
+        conflicts = jr.join_results([first, second], self.target)
+        self.assertEqual((self.target / 'results.csv').read_text(), HEADER + 'o/a,c1,Maven,,0,1\n')
+        self.assertEqual(conflicts[:3], [f"Conflicting row o/a in {second / 'results.csv'} skipped, the first one was kept",
+                                         f"Invalid row 3 in {second / 'results.csv'} skipped",
+                                         f"Invalid row 4 in {second / 'results.csv'} skipped"])
+        self.assertFalse((first / 'results.csv').exists())
+        self.assertEqual((second / 'results.csv').read_text(),
+                         HEADER + 'o/a,c1,Maven,,1,1\no/b,c2,Ant,,x,0\no/c,c3,Ant,,0\n')
+
+    def test_header_mismatch_stops_before_merging(self):
+        first = self.create_source('a', ['o/a,c1,Maven,,0,1\n'])
+        second = self.create_source('b', ['o/b,c2,Maven,,0\n'], header='name,commit,tool,wrapper,java6\n')
+        with self.assertRaises(SystemExit):
+            jr.join_results([first, second], self.target)
+        self.assertFalse((self.target / 'results.csv').exists())
+        self.assertTrue((first / 'results.csv').exists())
+
+    def test_logs_are_copied_across_devices(self):
+        first = self.create_source('a', ['o/a,c1,Maven,,0,1\n'])
+        def cross_device_rename(source, target):
+            if Path(source).parent == first:
+                raise OSError(EXDEV, 'Invalid cross-device link')
+            rename(source, target)
+        with patch('os.rename', side_effect=cross_device_rename):
+            jr.join_results([first], self.target)
+        self.assertEqual((self.target / 'o_a' / '06.fail').read_text(), 'a')
+        self.assertFalse(first.exists())
+
+    def test_columnar_results_hold_exit_codes_as_bytes(self):
+        first = self.create_source('a', ['o/a,c1,Maven,,0,1\n', 'o/bž,c2,Ant,,224,134\n'])
+        jr.join_results([first], self.target)
+        with load(self.target / 'results.npz') as data:
+            self.assertEqual(data['fields'].tolist(), ['name', 'commit', 'tool', 'wrapper', 'java6', 'java7'])
+            self.assertEqual(data['text_fields'].tolist(), ['name', 'commit', 'tool', 'wrapper'])
+            self.assertEqual(data['exitcode_fields'].tolist(), ['java6', 'java7'])
+            self.assertEqual(data['name'].tolist(), ['o/a', 'o/bž'])
+            self.assertEqual(data['wrapper'].tolist(), ['', ''])
+            self.assertEqual(data['exitcodes'].dtype, uint8)
+            self.assertEqual(data['exitcodes'].tolist(), [[0, 1], [224, 134]])
+
+if __name__ == '__main__':
+    main()
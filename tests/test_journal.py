@@ -0,0 +1,50 @@
+from pathlib import Path
+from sys import path
+from tempfile import TemporaryDirectory
+from unittest import main, TestCase
+path.insert(1, str((Path(__file__).parent / '..' / 'execution').resolve()))
+from journal import Journal
+
+FIELDS = ['name', 'jdk', 'exitcode']
+
+class TestJournal(TestCase):
+    def test_records_survive_reopening(self):
+        with TemporaryDirectory() as temp_dir:
+            journal_path = Path(temp_dir) / 'journal.csv'
+            with Journal(journal_path, FIELDS) as journal:
+                journal.append({'name': 'a/b', 'jdk': 6, 'exitcode': 0})
+                journal.append({'name': 'a/b', 'jdk': 7, 'exitcode': 1})
+                journal.append({'name': 'c/d', 'jdk': 6, 'exitcode': 124})
+            with Journal(journal_path, FIELDS) as journal:
+                completed = journal.completed('a/b')
+        self.assertEqual(set(completed), {6, 7})
+        self.assertEqual(completed[7]['exitcode'], '1')
+
+    def test_header_is_written_once(self):
+        with TemporaryDirectory() as temp_dir:
+            journal_path = Path(temp_dir) / 'journal.csv'
+            for jdk in (6, 7):
+                with Journal(journal_path, FIELDS) as journal:
+                    journal.append({'name': 'a/b', 'jdk': jdk, 'exitcode': 0})
+            self.assertEqual(journal_path.read_text().splitlines(), ['name,jdk,exitcode', 'a/b,6,0', 'a/b,7,0'])
+
+    def test_torn_record_is_dropped(self):
+        with TemporaryDirectory() as temp_dir:
+            journal_path = Path(temp_dir) / 'journal.csv'
+            journal_path.write_text('name,jdk,exitcode\r\na/b,6,0\r\na/b,7,13')
+            with Journal(journal_path, FIELDS) as journal:
+                self.assertEqual(set(journal.completed('a/b')), {6})
+                journal.append({'name': 'a/b', 'jdk': 7, 'exitcode': 137})
+            with Journal(journal_path, FIELDS) as journal:
+                self.assertEqual(journal.completed('a/b')[7]['exitcode'], '137')
+
+    def test_records_are_synced_in_batches(self):
+        with TemporaryDirectory() as temp_dir:
+            with Journal(Path(temp_dir) / 'journal.csv', FIELDS, batch_size=2, batch_seconds=3600) as journal:
+                journal.append({'name': 'a/b', 'jdk': 6, 'exitcode': 0})
+                self.assertEqual(journal.pending, 1)
+                journal.append({'name': 'a/b', 'jdk': 7, 'exitcode': 0})
+                self.assertEqual(journal.pending, 0)
+
+if __name__ == '__main__':
+    main()
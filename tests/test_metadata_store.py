@@ -0,0 +1,101 @@
+from csv import DictReader
+from os import utime
+from pathlib import Path
+from random import seed, shuffle
+from sys import path
+from tempfile import TemporaryDirectory
+from unittest import main, TestCase
+from unittest.mock import patch
+path.insert(1, str((Path(__file__).parent / '..').resolve()))
+import metadata_store
+from common import RANDOM_SEED
+from metadata_store import MetadataStore
+
+CSV = ('name,license,description\n'
+       'owner/a,MIT,plain\n'
+       'owner/b,Other,"quoted, with comma"\n'
+       '\n'
+       'owner/c,MIT,"multi\nline ""quoted"" ž"\n'
+       'owner/d,Apache,\n')
+
+class TestMetadataStore(TestCase):
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.github_csv = Path(self.temp_dir.name) / 'github.csv'
+        self.github_csv.write_text(CSV)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def read_rows(self):
+        with open(self.github_csv) as file:
+            return list(DictReader(file))
+
+    def test_rows_at_offsets_equal_dict_reader_rows(self):
+        with MetadataStore(self.github_csv) as metadata:
+            self.assertEqual([metadata.row_at(offset) for offset in metadata.offsets()], self.read_rows())
+
+    def test_shuffled_offsets_follow_shuffled_rows(self):
+        projects = [row for row in self.read_rows() if row['license'] != 'Other']
+        seed(RANDOM_SEED)
+        shuffle(projects)
+        with MetadataStore(self.github_csv) as metadata:
+            offsets = metadata.offsets(lambda row: row['license'] != 'Other')
+            seed(RANDOM_SEED)
+            shuffle(offsets)
+            self.assertEqual(list(map(metadata.row_at, offsets)), projects)
+
+    def test_lookup_finds_rows_by_name(self):
+        with MetadataStore(self.github_csv) as metadata:
+            self.assertEqual(metadata.lookup('owner/c')['description'], 'multi\nline "quoted" ž')
+            self.assertEqual(metadata.lookup('owner/d', ['license']), {'license': 'Apache'})
+            self.assertIsNone(metadata.lookup('owner/missing'))
+
+    def test_lookup_resolves_hash_collisions(self):
+        with patch.object(metadata_store, 'get_name_hash', return_value=0):
+            with MetadataStore(self.github_csv) as metadata:
+                self.assertEqual(metadata.lookup('owner/d')['license'], 'Apache')
+                self.assertIsNone(metadata.lookup('owner/missing'))
+
+    def test_extract_writes_selected_rows(self):
+        with MetadataStore(self.github_csv) as metadata:
+            extracted = metadata.extract(['owner/d', 'owner/missing', 'owner/c'], ['name', 'description'])
+        self.assertEqual(extracted.splitlines()[0], 'name,description')
+        rows = list(DictReader(extracted.splitlines(keepends=True)))
+        self.assertEqual([row['name'] for row in rows], ['owner/d', 'owner/c'])
+
+    def test_index_is_rebuilt_after_csv_changes(self):
+        with MetadataStore(self.github_csv) as metadata:
+            self.assertIsNone(metadata.lookup('owner/e'))
+        self.github_csv.write_text(CSV + 'owner/e,MIT,new\n')
+        utime(self.github_csv, ns=(0, 0))
+        with MetadataStore(self.github_csv) as metadata:
+            self.assertEqual(metadata.lookup('owner/e')['description'], 'new')
+            self.assertEqual(len(metadata.offsets()), 5)
+
+    def test_hashes_are_sorted_in_buckets(self):
+        name_hashes = metadata_store.array('Q', [2 ** 63, 5, 2 ** 64 - 1, 5, 0, 2 ** 56])
+        order = metadata_store.sort_by_hash(name_hashes)
+        self.assertEqual(list(order), sorted(range(len(name_hashes)), key=name_hashes.__getitem__))
+
+    def test_rows_are_decoded_as_utf8_at_byte_offsets(self):
+        self.github_csv.write_bytes(CSV.replace('\n', '\r\n').encode() + b'owner/e,MIT,bad \xff byte\r\n')
+        with MetadataStore(self.github_csv) as metadata:
+            self.assertEqual(metadata.lookup('owner/c')['description'], 'multi\r\nline "quoted" ž')
+            self.assertEqual(metadata.lookup('owner/e')['description'], 'bad \ufffd byte')
+            self.assertEqual([metadata.row_at(offset)['name'] for offset in metadata.offsets()],
+                             ['owner/a', 'owner/b', 'owner/c', 'owner/d', 'owner/e'])
+
+    def test_damaged_index_is_rebuilt(self):
+        MetadataStore(self.github_csv).close()
+        index_path = self.github_csv.with_name('github.csv.idx')
+        index = index_path.read_bytes()
+        for damaged in (index[:10], index[:-1], index + b'\0', index[:len(metadata_store.INDEX_MAGIC) + 32] + b'x'):
+            with self.subTest(size=len(damaged)):
+                index_path.write_bytes(damaged)
+                with MetadataStore(self.github_csv) as metadata:
+                    self.assertEqual(metadata.lookup('owner/d')['license'], 'Apache')
+                self.assertEqual(index_path.read_bytes(), index)
+
+if __name__ == '__main__':
+    main()
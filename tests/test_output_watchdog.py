@@ -0,0 +1,45 @@
+from io import BytesIO
+from pathlib import Path
+from sys import path
+from threading import Event
+from time import sleep
+from unittest import main, TestCase
+path.insert(1, str((Path(__file__).parent / '..' / 'execution').resolve()))
+from output_watchdog import Watchdog
+
+class TestWatchdog(TestCase):
+    def test_output_is_passed_through(self):
+        output = BytesIO()
+        with Watchdog(output, lambda: None, silence_seconds=10) as watchdog:
+            watchdog.write(b'BUILD ')
+            watchdog.write(b'SUCCESSFUL\n')
+        self.assertEqual(output.getvalue(), b'BUILD SUCCESSFUL\n')
+        self.assertIsNone(watchdog.fired)
+
+    def test_silence_stops_build(self):
+        stopped = Event()
+        with Watchdog(BytesIO(), stopped.set, silence_seconds=0.1) as watchdog:
+            watchdog.write(b'> Task :compileJava\n')
+            self.assertTrue(stopped.wait(2))
+        self.assertEqual(watchdog.fired, 'silence')
+
+    def test_silence_after_pattern_stops_build(self):
+        stopped = Event()
+        with Watchdog(BytesIO(), stopped.set, patterns=['^FAILURE: '], pattern_silence_seconds=0.1) as watchdog:
+            watchdog.write(b'FAIL')
+            watchdog.write(b'URE: Build failed with an exception.\n')
+            self.assertTrue(stopped.wait(2))
+        self.assertEqual(watchdog.fired, 'pattern:^FAILURE: ')
+
+    def test_output_after_pattern_keeps_build_running(self):
+        stopped = Event()
+        with Watchdog(BytesIO(), stopped.set, patterns=['BUILD FAILED'], pattern_silence_seconds=0.2) as watchdog:
+            watchdog.write(b'BUILD FAILED\n')
+            for _ in range(5):
+                sleep(0.1)
+                watchdog.write(b'war:\n')
+        self.assertFalse(stopped.is_set())
+        self.assertIsNone(watchdog.fired)
+
+if __name__ == '__main__':
+    main()
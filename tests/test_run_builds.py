@@ -1,11 +1,20 @@
-from os import linesep
+from csv import DictReader
+from os import environ, getpid, linesep, pathsep
 from pathlib import Path
-from sys import path
+from random import seed
+from subprocess import run
+from sys import exit, path
 from tempfile import TemporaryDirectory
+from threading import Event
+from time import sleep
 from unittest import main, TestCase
+from unittest.mock import patch
 from common import RESULTS_CSV, Tool
 path.insert(1, str((Path(__file__).parent / '..' / 'execution').resolve()))
 rb = __import__('run-builds')
+from journal import Journal
+from result_cache import ResultCache
+from work_queue import WorkQueue
 
 class TestRunBuilds(TestCase):
     def test_volume_name_is_user_friendly(self):
@@ -18,6 +27,172 @@ class TestRunBuilds(TestCase):
         volume_names = [rb.get_volume_name(cache_dir) for cache_dir in cache_dirs]
         self.assertEqual(len(volume_names), len(set(volume_names)))
 
+    def test_volume_names_differ_per_worker(self):
+        cache_dir = '/root/.tool/cache'
+        volume_names = [rb.get_volume_name(cache_dir, worker) for worker in ['', 'a_0', 'a_1', 'b_0']]
+        self.assertEqual(len(volume_names), len(set(volume_names)))
+
+    def test_container_names_differ_per_worker(self):
+        container_names = [rb.get_container_name(worker) for worker in ['', 'a_0', 'a_1']]
+        self.assertEqual(len(container_names), len(set(container_names)))
+
+    def test_workers_are_unique_per_result_dir(self):
+        workers = rb.get_workers(Path('results1'), 3) + rb.get_workers(Path('results2'), 3)
+        self.assertEqual(len(workers), len(set(workers)))
+        self.assertEqual(rb.get_workers(Path('results1'), 2), rb.get_workers(Path('results1'), 2))
+
+    def test_scheduled_results_keep_project_order(self):
+        project_dirs = [Path(f'owner_repo{i}') for i in range(20)]
+        busy = set()
+
+        def build_project(project_name, _project_dir, _log_dir, worker, *_):
+            self.assertNotIn(worker, busy)
+            busy.add(worker)
+            sleep(0.001 * (hash(project_name) % 5))
+            busy.remove(worker)
+            return {'name': project_name}, []
+
+        with patch.object(rb, 'build_project', build_project), patch.object(rb, 'clear_cache_volumes'):
+            results = list(rb.schedule_builds(project_dirs, Path('logs'), ['w_0', 'w_1', 'w_2']))
+        self.assertEqual([r['name'] for r, _ in results], [rb.get_project_name(p) for p in project_dirs])
+
+    def test_stopped_schedule_skips_queued_projects(self):
+        project_dirs = [Path(f'owner_repo{i}') for i in range(5)]
+        built = []
+
+        def build_project(project_name, *_):
+            built.append(project_name)
+            rb.stopping.set()
+            exit(1)
+
+        with (patch.object(rb, 'build_project', build_project), patch.object(rb, 'clear_cache_volumes'),
+              patch.object(rb, 'stopping', Event())):
+            with self.assertRaises(SystemExit):
+                list(rb.schedule_builds(project_dirs, Path('logs'), ['w_0']))
+        self.assertEqual(len(built), 1)
+
+    def test_java_versions_are_shuffled_per_project(self):
+        orders = []
+
+        def build_or_reuse(_project_dir, java_version, *_):
+            orders[-1].append(java_version)
+            return 0, {}
+
+        with (TemporaryDirectory() as temp_dir, patch.object(rb, 'build_or_reuse', build_or_reuse),
+              patch.object(rb, 'analyze_project', side_effect=lambda name, _: (['mvn'], {'name': name}))):
+            for name in ('owner/a', 'owner/b', 'owner/a'):
+                orders.append([])
+                seed(len(orders))
+                rb.build_project(name, Path(temp_dir) / name.replace('/', '_'), Path(temp_dir))
+        self.assertEqual(orders[0], orders[2])
+        self.assertNotEqual(orders[0], orders[1])
+
+    def test_pooled_container_is_reset_between_builds_and_replaced_after_failure(self):
+        fake_docker = Path(__file__).parent / 'fake-docker'
+        options = rb.Options(backend='pool', docker_cli=True)
+        with (TemporaryDirectory() as temp_dir,
+              patch.dict(environ, {'PATH': f"{fake_docker}{pathsep}{environ['PATH']}",
+                                   'FAKE_DOCKER_LOG': str(Path(temp_dir) / 'docker.log')}),
+              patch.dict(rb.pool_containers, clear=True), patch.object(rb, 'engine', None)):
+            project_dir = Path(temp_dir) / 'owner_repo'
+            project_dir.mkdir()
+            log = Path(temp_dir) / 'docker.log'
+
+            def build():
+                log.write_text('')
+                exitcode, _ = rb.build_project_with_java(project_dir, 17, ['mvn'], Path(temp_dir), 'w_0', options)
+                return exitcode, [line.split() for line in log.read_text().splitlines()]
+
+            exitcode, first = build()
+            self.assertEqual(exitcode, 0)
+            self.assertEqual([command[0] for command in first], ['run', 'exec', 'exec', 'cp', 'exec'])
+            self.assertEqual(first[0][:2], ['run', '--detach'])
+            self.assertFalse(any(str(project_dir.parent) in arg for arg in first[0]))
+            exitcode, second = build()
+            self.assertEqual([command[0] for command in second], ['exec', 'cp', 'exec'])
+            container = rb.get_pool_container_name('w_0', 17)
+            self.assertEqual(second[1][1:], [str(project_dir), f'{container}:{rb.POOL_DATASET}/'])
+            build_command = ' '.join(second[-1])
+            self.assertIn(f'{rb.POOL_RESET} && exec /app/run-build.sh', build_command)
+            self.assertIn('--env=POOLED=1', second[-1])
+            self.assertIn(f'find {rb.BUILD_DIR} {rb.OVERLAY_DIR} -mindepth 1 -delete', rb.POOL_RESET)
+            self.assertIn(f'cp -a {rb.POOL_SNAPSHOT}/. /root', rb.POOL_RESET)
+
+            log.write_text('')
+            rb.clear_cache_volumes('w_0')
+            self.assertEqual(log.read_text().split(), ['exec', rb.get_pool_container_name('w_0', 17), 'find',
+                                                       *rb.CACHE_DIRS, '-mindepth', '1', '-delete'])
+
+            with patch.dict(environ, {'FAKE_EXITCODES': '1', 'FAKE_RUNNING': 'false'}):
+                exitcode, failed = build()
+            self.assertEqual(exitcode, 1)
+            self.assertEqual(failed[-1][:3], ['rm', '--force', rb.get_pool_container_name('w_0', 17)])
+            self.assertEqual(rb.pool_containers, {})
+            _, replaced = build()
+            self.assertEqual(sum(command[:2] == ['run', '--detach'] for command in replaced), 1)
+
+    def test_stale_resources_of_crashed_queue_workers_are_removed(self):
+        fake_docker = Path(__file__).parent / 'fake-docker'
+        with TemporaryDirectory() as temp_dir:
+            result_dir = Path(temp_dir) / 'results'
+            dead_pid = run(['sh', '-c', 'echo $$'], capture_output=True, text=True).stdout.strip()
+            live_worker = rb.get_workers(result_dir, 1, shared=True)[0]
+            dead_worker = live_worker.replace(f'_{getpid()}_', f'_{dead_pid}_')
+            other_worker = rb.get_workers(Path(temp_dir) / 'other', 1, shared=True)[0].replace(f'_{getpid()}_',
+                                                                                                f'_{dead_pid}_')
+            containers = [rb.get_container_name(dead_worker), rb.get_pool_container_name(dead_worker, 17),
+                          rb.get_container_name(live_worker), rb.get_container_name(other_worker)]
+            log = Path(temp_dir) / 'docker.log'
+            with (patch.dict(environ, {'PATH': f"{fake_docker}{pathsep}{environ['PATH']}",
+                                       'FAKE_DOCKER_LOG': str(log), 'FAKE_CONTAINERS': ' '.join(containers)}),
+                  patch.object(rb, 'engine', None)):
+                rb.remove_stale_workers(result_dir)
+            removed = [line for line in log.read_text().splitlines() if line.startswith('rm')]
+            self.assertEqual(removed, [f'rm --force {containers[0]} {containers[1]}'])
+
+    def test_sizes_are_parsed_with_units(self):
+        self.assertEqual(rb.parse_size('512'), 512)
+        self.assertEqual(rb.parse_size('4k'), 4096)
+        self.assertEqual(rb.parse_size('8G'), 8 * 1024 ** 3)
+        with self.assertRaises(ValueError):
+            rb.parse_size('8 GB')
+
+    def test_copy_staging_uses_no_tmpfs(self):
+        mounts, env, host_config = rb.get_container_config('w_0', rb.Options(staging='copy'))
+        self.assertNotIn('tmpfs', [mount['Type'] for mount in mounts])
+        self.assertIn('STAGING=copy', env)
+        self.assertEqual(host_config, {})
+
+    def test_class_data_sharing_is_opt_in(self):
+        self.assertIn('USE_CDS=0', rb.get_container_config('w_0', rb.Options())[1])
+        self.assertIn('USE_CDS=1', rb.get_container_config('w_0', rb.Options(cds=True))[1])
+
+    def test_tmpfs_staging_mounts_sized_build_dir(self):
+        mounts, _, _ = rb.get_container_config('w_0', rb.Options(staging='tmpfs', tmpfs_size=1024))
+        options = rb.get_docker_options(mounts)
+        self.assertIn(f'--mount=type=tmpfs,dst={rb.BUILD_DIR},tmpfs-size=1024', options)
+
+    def test_overlay_staging_mounts_upper_layer_and_allows_mounting(self):
+        mounts, env, host_config = rb.get_container_config('w_0', rb.Options(staging='overlay', tmpfs_size=1024))
+        options = rb.get_docker_options(mounts, env, host_config)
+        self.assertIn(f'--mount=type=tmpfs,dst={rb.OVERLAY_DIR},tmpfs-size=1024', options)
+        self.assertIn('--cap-add=SYS_ADMIN', options)
+        self.assertIn('--env=STAGING=overlay', options)
+
+    def test_metrics_convert_report_units(self):
+        report = {'user_usec': 1500000, 'system_usec': 250000, 'peak_memory_bytes': 1024,
+                  'written_bytes': 2048, 'staging_ns': 3000000000}
+        metrics = rb.get_metrics(12.3456, report)
+        self.assertEqual(list(metrics), rb.METRICS_FIELDS[2:])
+        self.assertEqual(metrics, {'wall_seconds': 12.346, 'user_seconds': 1.5, 'system_seconds': 0.25,
+                                   'peak_memory_bytes': 1024, 'written_bytes': 2048, 'staging_seconds': 3.0,
+                                   'watchdog': None})
+
+    def test_metrics_without_report_have_only_wall_time(self):
+        metrics = rb.get_metrics(1.0, {})
+        self.assertEqual(metrics['wall_seconds'], 1.0)
+        self.assertEqual({v for k, v in metrics.items() if k != 'wall_seconds'}, {None})
+
     def test_csv_is_prepared_if_absent(self):
         with TemporaryDirectory() as temp_dir:
             results_dir = Path(temp_dir) / 'results'
@@ -85,6 +260,104 @@ class TestRunBuilds(TestCase):
             self.assertEqual(list(log_dir.iterdir()), [])
             self.assertEqual(log_dir.parent, results_dir)
 
+    def test_prepare_log_dir_keeps_completed_logs(self):
+        with TemporaryDirectory() as temp_dir:
+            results_dir = Path(temp_dir)
+            project_dir = Path('project_dir')
+            log_dir = rb.prepare_log_dir(project_dir, results_dir)
+            for name in ['06.pass', '07.fail', '08.pass', '09']:
+                (log_dir / name).touch()
+            log_dir = rb.prepare_log_dir(project_dir, results_dir, {6: {}, 7: {}})
+            self.assertEqual({file.name for file in log_dir.iterdir()}, {'06.pass', '07.fail'})
+
+    def test_build_project_runs_only_missing_journaled_builds(self):
+        built = []
+
+        def build_project_with_java(_project_dir, java_version, *_):
+            built.append(java_version)
+            return java_version % 2, rb.get_metrics(1.0, {})
+
+        with TemporaryDirectory() as temp_dir:
+            journal_path = Path(temp_dir) / rb.JOURNAL_FILE
+            with Journal(journal_path, rb.JOURNAL_FIELDS) as journal:
+                journal.append({'name': 'owner/repo', 'jdk': 6, 'exitcode': 124, 'wall_seconds': 3600})
+            with (Journal(journal_path, rb.JOURNAL_FIELDS) as journal,
+                  patch.object(rb, 'analyze_project', return_value=('mvn', {'name': 'owner/repo'})),
+                  patch.object(rb, 'build_project_with_java', build_project_with_java)):
+                result, metrics = rb.build_project('owner/repo', Path('owner_repo'), Path(temp_dir), journal=journal)
+                self.assertEqual(len(journal.completed('owner/repo')), rb.MAX_JAVA - rb.MIN_JAVA + 1)
+
+        self.assertEqual(sorted(built), list(range(rb.MIN_JAVA + 1, rb.MAX_JAVA + 1)))
+        self.assertEqual(result['java6'], 124)
+        self.assertEqual(result['java7'], 1)
+        self.assertEqual(next(m for m in metrics if m['jdk'] == 6)['wall_seconds'], '3600')
+
+    def test_queued_project_of_crashed_worker_resumes_missing_builds(self):
+        built = []
+
+        def build_project_with_java(_project_dir, java_version, *_):
+            built.append(java_version)
+            return 0, rb.get_metrics(1.0, {})
+
+        with TemporaryDirectory() as temp_dir:
+            result_dir = Path(temp_dir)
+            csv_fields = ['name'] + [f'java{v}' for v in range(rb.MIN_JAVA, rb.MAX_JAVA + 1)]
+            results = (rb.prepare_results_csv(result_dir, csv_fields), csv_fields,
+                       rb.prepare_results_csv(result_dir, rb.METRICS_FIELDS, rb.METRICS_CSV), rb.METRICS_FIELDS)
+            queue = WorkQueue(result_dir / 'queue.sqlite', lease_seconds=0.05, poll_seconds=0.01)
+            queue.populate(['owner/repo'])
+            self.assertEqual(queue.claim('crashed'), 'owner/repo')
+            for java_version in (6, 7):
+                queue.append({'name': 'owner/repo', 'jdk': java_version, 'exitcode': 1} | rb.get_metrics(2.0, {})
+                             | {'watchdog': None})
+            sleep(0.1)
+
+            with (patch.object(rb, 'analyze_project', return_value=(['mvn'], {'name': 'owner/repo'})),
+                  patch.object(rb, 'build_project_with_java', build_project_with_java),
+                  patch.object(rb, 'clear_cache_volumes')):
+                rb.build_from_queue(queue, result_dir, result_dir, ['w_0'], rb.Options(), results)
+
+            self.assertEqual(sorted(built), list(range(8, rb.MAX_JAVA + 1)))
+            with open(result_dir / rb.RESULTS_CSV) as results_file:
+                rows = list(DictReader(results_file))
+            self.assertEqual([(row['name'], row['java7'], row['java8']) for row in rows], [('owner/repo', '1', '0')])
+
+    def test_build_project_reuses_cached_builds_with_same_image(self):
+        built = []
+
+        def build_project_with_java(_project_dir, java_version, _builder, log_dir, *_):
+            built.append(java_version)
+            (log_dir / f'{java_version:02d}.pass').write_text(f'log {java_version}')
+            return 0, rb.get_metrics(1.0, {})
+
+        image_ids = {v: f'sha256:{v}' for v in range(rb.MIN_JAVA, rb.MAX_JAVA + 1)}
+        result = {'name': 'owner/repo', 'commit': 'abc', 'tool': 'Maven', 'wrapper': None}
+        with (TemporaryDirectory() as temp_dir,
+              patch.object(rb, 'result_cache', ResultCache(Path(temp_dir) / 'cache')),
+              patch.object(rb, 'analyze_project', side_effect=lambda *_: ('mvn', dict(result))),
+              patch.object(rb, 'get_image_id', side_effect=lambda v: image_ids[v]),
+              patch.object(rb, 'build_project_with_java', build_project_with_java)):
+            rb.build_project('owner/repo', Path('owner_repo'), Path(temp_dir))
+            image_ids[11] = 'sha256:rebuilt'
+            built.clear()
+            rb.build_project('owner/repo', Path('owner_repo'), Path(temp_dir))
+
+            self.assertEqual(built, [11])
+            self.assertEqual(rb.result_cache.hits, rb.MAX_JAVA - rb.MIN_JAVA)
+            self.assertEqual((Path(temp_dir) / 'owner_repo' / '06.pass').read_text(), 'log 6')
+
+            for options in (rb.Options(cds=True), rb.Options(staging='tmpfs'), rb.Options(stall_timeout=60.0)):
+                built.clear()
+                rb.build_project('owner/repo', Path('owner_repo'), Path(temp_dir), options=options)
+                self.assertEqual(len(built), rb.MAX_JAVA - rb.MIN_JAVA + 1, options)
+
+    def test_cache_key_depends_on_build_target(self):
+        settings = {'cds': False}
+        key = rb.get_cache_key('abc', 'Ant', None, 'sha256:1', ['ant', 'clean', 'jar'], settings)
+        self.assertEqual(key, rb.get_cache_key('abc', 'Ant', None, 'sha256:1', ['ant', 'clean', 'jar'], settings))
+        self.assertNotEqual(key, rb.get_cache_key('abc', 'Ant', None, 'sha256:1', ['ant', 'clean', 'dist'], settings))
+        self.assertNotEqual(key, rb.get_cache_key('abc', 'Ant', None, 'sha256:1', ['ant', 'clean', 'jar']))
+
     def test_highest_priority_tool_is_detected(self):
         tools = {('build.gradle', 'pom.xml', 'build.xml'): 'Gradle',
                  ('settings.gradle', 'pom.xml', 'build.xml'): 'Gradle',
@@ -121,5 +394,49 @@ class TestRunBuilds(TestCase):
         with TemporaryDirectory() as temp_dir:
             self.assertIsNone(rb.detect_wrapper(Path(temp_dir), tool))
 
+    def test_ant_target_is_chosen_from_imported_build_files(self):
+        with TemporaryDirectory() as temp_dir:
+            project_dir = Path(temp_dir)
+            (project_dir / 'common').mkdir()
+            (project_dir / 'build.xml').write_text('<project default="compile"><import file="common/targets.xml"/>'
+                                                   '<target name="clean"/><target name="compile"/>'
+                                                   '<target name="dist"/></project>')
+            (project_dir / 'common' / 'targets.xml').write_text('<project><import file="../build.xml"/>'
+                                                                '<target name="war"/></project>')
+            with patch.object(rb, 'get_commit', return_value='abc'):
+                build_args, result = rb.analyze_project('owner/repo', project_dir)
+                self.assertEqual(build_args, ['ant', 'clean', 'war'])
+                self.assertEqual(result['target'], 'war')
+
+                (project_dir / 'common' / 'targets.xml').write_text('<project/>')
+                self.assertEqual(rb.analyze_project('owner/repo', project_dir)[0], ['ant', 'clean', 'dist'])
+                (project_dir / 'build.xml').write_text('<project default="compile"><target name="compile"/></project>')
+                self.assertEqual(rb.analyze_project('owner/repo', project_dir)[0], ['ant', 'compile'])
+
+    def test_ant_targets_are_not_chosen_if_an_import_is_unresolved(self):
+        with TemporaryDirectory() as temp_dir:
+            project_dir = Path(temp_dir)
+            (project_dir / 'build.xml').write_text('<project default="build"><import file="${basedir}/common.xml"/>'
+                                                   '<target name="clean"/></project>')
+            with patch.object(rb, 'get_commit', return_value='abc'):
+                build_args, result = rb.analyze_project('owner/repo', project_dir)
+                self.assertEqual(build_args, ['ant'])
+                self.assertIsNone(result['target'])
+
+                (project_dir / 'build.xml').write_text('<project default="build"><target name="clean"/></project>')
+                self.assertEqual(rb.analyze_project('owner/repo', project_dir)[0], ['ant'])
+                (project_dir / 'build.xml').write_text('<project default="clean"><target name="clean"/></project>')
+                self.assertEqual(rb.analyze_project('owner/repo', project_dir)[0], ['ant'])
+
+    def test_ant_targets_are_not_chosen_from_unparsable_build_file(self):
+        with TemporaryDirectory() as temp_dir:
+            project_dir = Path(temp_dir)
+            (project_dir / 'build.xml').write_text('<!DOCTYPE project [<!ENTITY common SYSTEM "common.xml">]>'
+                                                   '<project>&common;</project>')
+            with patch.object(rb, 'get_commit', return_value='abc'):
+                build_args, result = rb.analyze_project('owner/repo', project_dir)
+            self.assertEqual(build_args, ['ant'])
+            self.assertIsNone(result['target'])
+
 if __name__ == '__main__':
     main()
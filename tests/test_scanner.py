@@ -0,0 +1,87 @@
+from os import symlink
+from pathlib import Path
+from re import fullmatch, search
+from shutil import copytree
+from subprocess import DEVNULL, run
+from sys import path
+from tempfile import TemporaryDirectory
+from unittest import main, TestCase
+from unittest.mock import patch
+path.insert(1, str((Path(__file__).parent / '..' / 'dataset').resolve()))
+import scanner
+cd = __import__('create-dataset')
+
+class TestScanner(TestCase):
+    def test_tracked_files_are_listed_from_index(self):
+        with self.create_git_repo(Path(__file__).parent / 'include' / 'javase') as repo:
+            (Path(repo) / 'Untracked.java').touch()
+            files = scanner.list_files(repo)
+            self.assertTrue(files)
+            self.assertFalse(any('/.git/' in file or file.endswith('Untracked.java') for file in files))
+
+    def test_missing_tracked_file_is_excluded(self):
+        with self.create_git_repo(Path(__file__).parent / 'include' / 'javase') as repo:
+            java_file = next(Path(repo).rglob('*.java'))
+            self.assertFalse(cd.project_has_excluded_technology(repo))
+            java_file.unlink()
+            with self.assertLogs(level='ERROR'):
+                self.assertTrue(cd.project_has_excluded_technology(repo))
+
+    def test_symlinked_directory_is_skipped(self):
+        with self.create_git_repo(Path(__file__).parent / 'include' / 'javase') as repo:
+            (Path(repo) / 'linked').mkdir()
+            symlink('linked', Path(repo) / 'link.java')
+            run('git add . && git commit -m link', shell=True, cwd=repo, check=True, stdout=DEVNULL)
+            self.assertFalse(cd.project_has_excluded_technology(repo))
+
+    def test_processes_give_same_verdicts(self):
+        for verdict, projects in ((True, 'exclude'), (False, 'include')):
+            for project in (Path(__file__).parent / projects).iterdir():
+                with self.create_git_repo(project) as repo, patch.object(scanner, 'CHUNK_SIZE', 1):
+                    self.assertEqual(cd.project_has_excluded_technology(repo, jobs=2), verdict, project.name)
+
+    def test_search_pattern_keeps_matching_lines(self):
+        patterns = [r'\s*import\s+android\..*', r'.*', r' *x.*', r'a\\.*', r'.*?b', r'\s*+c']
+        lines = ['import android.view.View;', '\t import  android.app.Activity;', '', 'x', '  xyz', 'a\\', 'ab', 'c']
+        for pattern in patterns:
+            search_pattern = scanner.get_search_pattern(pattern)
+            for line in lines:
+                if fullmatch(pattern, line):
+                    self.assertIsNotNone(search(search_pattern, f'before\n{line}  \nafter'), (pattern, line))
+
+    def test_file_matches_present_patterns(self):
+        file = Path(__file__).parent / 'match' / 'match.txt'
+        patterns = [[r'match\.txt', r'start middle end'],
+                    [r'.*\.txt', r'start middle .*'],
+                    [r'match\..*', r'.* middle end'],]
+        for name, content in patterns:
+            self.assertTrue(scanner.any_file_matches([file], [[name, content]]),
+                            f"File {name} does not contain {content}")
+
+    def test_file_does_not_match_absent_patterns(self):
+        file = Path(__file__).parent / 'match' / 'match.txt'
+        patterns = [[r'match', r'start middle end'],
+                    [r'txt', r'start middle end'],
+                    [r'.*', r'start middle'],
+                    [r'.*', r'middle end']]
+        for name, content in patterns:
+            self.assertFalse(scanner.any_file_matches([file], [[name, content]]),
+                             f"File {name} contains {content}")
+
+    def test_text_and_file_scanning_agree(self):
+        for verdict, projects in ((True, 'exclude'), (False, 'include')):
+            files = [str(file) for file in (Path(__file__).parent / projects).rglob('*') if file.is_file()]
+            texts = [(file.name, file.read_bytes().decode('ascii', errors='ignore')) for file in map(Path, files)]
+            self.assertEqual(any(scanner.text_has_matching_line(text, scanner.get_patterns(name, cd.EXCLUDE))
+                                 for name, text in texts), verdict)
+            self.assertEqual(scanner.any_file_matches(files, cd.EXCLUDE), verdict)
+
+    @staticmethod
+    def create_git_repo(project):
+        repo = TemporaryDirectory()
+        copytree(project, repo.name, dirs_exist_ok=True)
+        run('git init && git add . && git commit -m test', shell=True, cwd=repo.name, check=True, stdout=DEVNULL)
+        return repo
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+from os import symlink
+from pathlib import Path
+from sys import path
+from tempfile import TemporaryDirectory
+from time import sleep
+from unittest import main, TestCase
+from unittest.mock import patch
+path.insert(1, str((Path(__file__).parent / '..').resolve()))
+import seekable_archive
+from seekable_archive import SeekableArchive, create_archive, get_log_member, open_log_reader
+
+class TestSeekableArchive(TestCase):
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.results_dir = Path(self.temp_dir.name)
+        self.log_dir = self.results_dir / 'logs'
+        for i in range(5):
+            project_dir = self.log_dir / f'owner_repo{i}'
+            (project_dir / 'sub').mkdir(parents=True)
+            (project_dir / '17.fail').write_text(f'failure {i}\n' * 100)
+            (project_dir / '21.pass').write_text('success\n')
+            (project_dir / 'sub' / 'file').write_bytes(bytes(range(256)))
+        symlink('17.fail', self.log_dir / 'owner_repo0' / 'link')
+        self.archive = self.results_dir / 'logs.xza'
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_members_are_read_from_any_unit(self):
+        create_archive(self.log_dir, self.archive, jobs=3)
+        with SeekableArchive(self.archive) as archive:
+            self.assertEqual(sorted(archive.units), [f'owner_repo{i}' for i in range(5)])
+            for i in (3, 0, 3, 4):
+                self.assertEqual(archive.read('owner_repo%d/17.fail' % i).decode(), f'failure {i}\n' * 100)
+            self.assertEqual(archive.read('owner_repo1/sub/file'), bytes(range(256)))
+            self.assertRaises(KeyError, archive.read, 'owner_repo1/missing')
+            self.assertRaises(KeyError, archive.read, 'owner_repo1/sub')
+
+    def test_member_is_read_without_decompressing_whole_unit(self):
+        create_archive(self.log_dir, self.archive)
+        with (SeekableArchive(self.archive) as archive,
+              patch.object(seekable_archive, 'decompress', side_effect=AssertionError)):
+            self.assertEqual(archive.read('owner_repo2/21.pass'), b'success\n')
+
+    def test_extracted_units_equal_source(self):
+        create_archive(self.log_dir, self.archive, jobs=2)
+        output_dir = self.results_dir / 'out'
+        with SeekableArchive(self.archive) as archive:
+            archive.extract(['owner_repo0', 'owner_repo2'], output_dir)
+        self.assertEqual(sorted(p.name for p in (output_dir / 'logs').iterdir()), ['owner_repo0', 'owner_repo2'])
+        for file in (self.log_dir / 'owner_repo0').rglob('*'):
+            extracted = output_dir / file.relative_to(self.results_dir)
+            if file.is_symlink():
+                self.assertEqual(extracted.readlink(), file.readlink())
+            elif file.is_file():
+                self.assertEqual(extracted.read_bytes(), file.read_bytes())
+
+    def test_units_are_ordered_regardless_of_completion(self):
+        compress_unit = seekable_archive.compress_unit
+        def reversed_delays(source_dir, unit, archive, preset):
+            sleep(0.05 * (5 - int(unit[-1])))
+            return compress_unit(source_dir, unit, archive, preset)
+        with patch.object(seekable_archive, 'compress_unit', side_effect=reversed_delays):
+            create_archive(self.log_dir, self.archive, jobs=5)
+        with SeekableArchive(self.archive) as archive:
+            offsets = [archive.units[f'owner_repo{i}'][0] for i in range(5)]
+            self.assertEqual(offsets, sorted(offsets))
+        self.assertEqual(sorted(p.name for p in self.results_dir.iterdir()), ['logs', 'logs.xza'])
+
+    def test_log_reader_prefers_directory(self):
+        create_archive(self.log_dir, self.archive)
+        member = get_log_member('owner/repo2', 17)
+        self.assertEqual(open_log_reader(self.results_dir)(member), 'failure 2\n' * 100)
+        (self.log_dir / 'owner_repo2' / '17.fail').write_text('changed')
+        self.assertEqual(open_log_reader(self.results_dir)(member), 'changed')
+        self.log_dir.rename(self.results_dir / 'old')
+        self.assertEqual(open_log_reader(self.results_dir)(member), 'failure 2\n' * 100)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+from csv import DictReader
+from pathlib import Path
+from sys import path
+from tempfile import TemporaryDirectory
+from unittest import main, TestCase
+path.insert(1, str((Path(__file__).parent / '..' / 'dataset').resolve()))
+sd = __import__('split-dataset')
+path.insert(1, str((Path(__file__).parent / '..' / 'execution').resolve()))
+rb = __import__('run-builds')
+
+class TestSplitDataset(TestCase):
+    def test_partitions_are_balanced_by_cost(self):
+        costs = {'a/a': 7, 'a/b': 5, 'a/c': 4, 'a/d': 3, 'a/e': 3, 'a/f': 2}
+        parts = sd.balance_partitions(costs, 2)
+        self.assertEqual(set(parts.values()), {1, 2})
+        self.assertEqual(sorted(sd.get_loads(costs, parts, 2).values()), [12, 12])
+
+    def test_larger_modular_gradle_projects_cost_more(self):
+        with TemporaryDirectory() as temp_dir:
+            ant, gradle = self.create_project(temp_dir, 'owner_ant', 'build.xml', 1), \
+                self.create_project(temp_dir, 'owner_gradle', 'build.gradle', 3)
+            self.assertGreater(sd.estimate_cost(gradle), sd.estimate_cost(ant))
+
+    def test_measured_costs_replace_and_calibrate_estimates(self):
+        with TemporaryDirectory() as temp_dir:
+            projects = [self.create_project(temp_dir, f'owner_p{i}', 'pom.xml', 1) for i in range(3)]
+            metrics_csv = Path(temp_dir) / 'metrics.csv'
+            metrics_csv.write_text('name,jdk,wall_seconds\nowner/p0,8,10\nowner/p0,11,30\nowner/p1,8,\n')
+            costs = sd.estimate_costs(projects, metrics_csv)
+        jdk_count = rb.MAX_JAVA - rb.MIN_JAVA + 1
+        self.assertEqual(costs, {'owner/p0': 20 * jdk_count, 'owner/p1': 20 * jdk_count, 'owner/p2': 20 * jdk_count})
+
+    def test_manifest_assigns_all_projects_without_moving_them(self):
+        with TemporaryDirectory() as temp_dir:
+            dataset_dir = Path(temp_dir) / 'projects'
+            for i in range(5):
+                self.create_project(dataset_dir, f'owner_p{i}', 'pom.xml', i + 1)
+            manifest_csv = Path(temp_dir) / 'parts.csv'
+            sd.plan_partitions(dataset_dir, 2, manifest_csv)
+            with open(manifest_csv) as manifest_file:
+                rows = list(DictReader(manifest_file))
+            self.assertEqual(len(list(dataset_dir.iterdir())), 5)
+            parts = [rb.read_part(manifest_csv, part) for part in (1, 2)]
+        self.assertEqual({row['name'] for row in rows}, {f'owner/p{i}' for i in range(5)})
+        self.assertEqual(parts[0] | parts[1], {f'owner/p{i}' for i in range(5)})
+        self.assertFalse(parts[0] & parts[1])
+
+    @staticmethod
+    def create_project(parent, name, build_file, modules):
+        project_dir = Path(parent) / name
+        for module in range(modules):
+            module_dir = project_dir / (f'module{module}' if module else '')
+            module_dir.mkdir(parents=True, exist_ok=True)
+            (module_dir / build_file).write_text('x' * 1000)
+        return project_dir
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+from concurrent.futures import ThreadPoolExecutor
+from csv import DictReader
+from multiprocessing import get_context
+from pathlib import Path
+from sys import path
+from tempfile import TemporaryDirectory
+from time import sleep
+from unittest import main, TestCase
+path.insert(1, str((Path(__file__).parent / '..' / 'execution').resolve()))
+from work_queue import WorkQueue
+
+RESULT_FIELDS = ['name', 'java6', 'java7']
+METRICS_FIELDS = ['name', 'jdk', 'wall_seconds']
+
+def drain_queue(queue_path, temp_dir, owner):
+    queue = WorkQueue(queue_path, poll_seconds=0.01)
+    results = (Path(temp_dir) / 'results.csv', RESULT_FIELDS, Path(temp_dir) / 'metrics.csv', METRICS_FIELDS)
+    with queue.leases([owner]):
+        while (name := queue.claim(owner)) is not None:
+            for jdk in (6, 7):
+                if jdk not in queue.completed(name):
+                    sleep(0.01)
+                    queue.append({'name': name, 'jdk': jdk, 'exitcode': 0, 'wall_seconds': 0.01})
+            queue.finish(name, {'name': name, 'java6': 0, 'java7': 0})
+            queue.write_results(*results)
+
+class TestWorkQueue(TestCase):
+    def test_processes_share_queue_and_write_each_result_once(self):
+        with TemporaryDirectory() as temp_dir:
+            queue_path = Path(temp_dir) / 'queue.sqlite'
+            names = [f'owner/repo{i}' for i in range(12)]
+            WorkQueue(queue_path).populate(names)
+            (Path(temp_dir) / 'results.csv').write_text(','.join(RESULT_FIELDS) + '\n')
+            (Path(temp_dir) / 'metrics.csv').write_text(','.join(METRICS_FIELDS) + '\n')
+
+            processes = [get_context('spawn').Process(target=drain_queue, args=(queue_path, temp_dir, f'w{i}'))
+                         for i in range(3)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join(60)
+                self.assertEqual(process.exitcode, 0)
+
+            with open(Path(temp_dir) / 'results.csv') as results_file:
+                self.assertEqual(sorted(row['name'] for row in DictReader(results_file)), sorted(names))
+            with open(Path(temp_dir) / 'metrics.csv') as metrics_file:
+                self.assertEqual(len(list(DictReader(metrics_file))), 2 * len(names))
+
+    def test_expired_lease_is_claimed_with_completed_cells(self):
+        with TemporaryDirectory() as temp_dir:
+            queue = WorkQueue(Path(temp_dir) / 'queue.sqlite', lease_seconds=0.05, poll_seconds=0.01)
+            queue.populate(['a/b', 'c/d'])
+            self.assertEqual(queue.claim('crashed'), 'a/b')
+            queue.append({'name': 'a/b', 'jdk': 6, 'exitcode': 1})
+            self.assertEqual(queue.claim('alive'), 'c/d')
+            queue.finish('c/d', {'name': 'c/d'})
+
+            self.assertEqual(queue.claim('alive'), 'a/b')
+            self.assertEqual(queue.completed('a/b'), {6: {'name': 'a/b', 'jdk': 6, 'exitcode': 1}})
+
+    def test_held_lease_is_not_claimed(self):
+        with TemporaryDirectory() as temp_dir:
+            queue = WorkQueue(Path(temp_dir) / 'queue.sqlite', lease_seconds=0.3, poll_seconds=0.01)
+            queue.populate(['a/b', 'c/d'])
+            with queue.leases(['first']):
+                self.assertEqual(queue.claim('first'), 'a/b')
+                self.assertEqual(queue.claim('second'), 'c/d')
+                queue.finish('c/d', {'name': 'c/d'})
+                sleep(0.5)
+                with ThreadPoolExecutor(1) as executor:
+                    claimed = executor.submit(queue.claim, 'second')
+                    sleep(0.1)
+                    self.assertFalse(claimed.done())
+                    queue.finish('a/b', {'name': 'a/b'})
+                    self.assertIsNone(claimed.result(5))
+
+    def test_heartbeat_must_be_shorter_than_lease(self):
+        with TemporaryDirectory() as temp_dir:
+            self.assertEqual(WorkQueue(Path(temp_dir) / 'queue.sqlite', 30.0).heartbeat_seconds, 10.0)
+            self.assertEqual(WorkQueue(Path(temp_dir) / 'queue.sqlite', 30.0, heartbeat_seconds=5.0).heartbeat_seconds,
+                             5.0)
+            with self.assertRaises(ValueError):
+                WorkQueue(Path(temp_dir) / 'queue.sqlite', 30.0, heartbeat_seconds=30.0)
+
+    def test_populating_again_keeps_order_and_progress(self):
+        with TemporaryDirectory() as temp_dir:
+            queue = WorkQueue(Path(temp_dir) / 'queue.sqlite')
+            queue.populate(['a/b', 'c/d'])
+            queue.claim('first')
+            queue.finish('a/b', {'name': 'a/b'})
+            WorkQueue(Path(temp_dir) / 'queue.sqlite').populate(['e/f', 'a/b', 'c/d'])
+            self.assertEqual(queue.claim('second'), 'c/d')
+
+if __name__ == '__main__':
+    main()